@@ -0,0 +1,386 @@
+# bench.py
+
+"""
+Benchmarks of loading, fitting and rendering.
+
+Run from the repository root:
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --output new.json --compare bench.json
+
+Every benchmark is repeated and the best, median and mean wall times are written to JSON
+together with the commit and library versions, so results of two commits can be compared.
+Other commits are measured by this script with --repo pointing to their checkout, e.g.:
+
+    git worktree add ../base <commit>
+    python benchmarks/bench.py --repo ../base --output base.json
+    python benchmarks/bench.py --output new.json --compare base.json
+
+Where the measured tree lacks a module or an option used here (down to the first version),
+the benchmarks fall back to its older API (see Modules) or are skipped.
+"""
+
+import argparse
+import glob
+import importlib
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import types
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+import scipy
+
+FIT_TYPES = ("Single Exp. Decay", "Double Exp. Decay", "Aux")
+FIT_METHODS = {"Single Exp. Decay": "single_exp_decay", "Double Exp. Decay": "double_exp_decay", "Aux": "auxiliary"}
+PARAM_NAMES = ("y0", "A1", "tau1", "A2", "tau2")
+SOLVERS = ("curve_fit", "varpro")
+SYNTHETIC_LENGTHS = (1000, 10000, 100000)
+SEED = 12345
+
+
+def optional_import(module, name):
+    """
+    Returns the attribute of the module, None if the measured tree does not have it.
+    """
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError):
+        return None
+
+
+def accepts(func, name):
+    """
+    True if func has an explicit parameter of the name (not only **kwargs).
+    """
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class Modules:
+    """
+    Classes of the measured tree (None where the tree has no such module) and adapters
+    falling back to the older APIs: loaders without the cache, Fitter without options
+    and with fit functions per fit type, sections kept as a list of dicts.
+    """
+
+    def __init__(self, repo):
+        sys.path.insert(0, repo)
+        self.repo = repo
+        self.DataLoader = optional_import("modules.data_loader", "DataLoader")
+        self.Fitter = optional_import("modules.fitter", "Fitter")
+        self.App = optional_import("modules.app", "App")
+        self.BlitManager = optional_import("modules.blit", "BlitManager")
+        self.SectionTable = optional_import("modules.sections", "SectionTable")
+
+    def loader(self):
+        # Parsing is measured, not the cache
+        if accepts(self.DataLoader.__init__, "use_cache"):
+            return self.DataLoader(use_cache=False)
+        return self.DataLoader()
+
+    def load(self, path):
+        return self.loader().load_xyc(path)
+
+    def solvers(self):
+        return tuple(getattr(self.Fitter, "SOLVERS", ("curve_fit",)))
+
+    def fitter(self, solver="curve_fit"):
+        options = {"solver": solver, "cache_size": 0}  # Every repeat fits again
+        return self.Fitter(**{key: value for key, value in options.items() if accepts(self.Fitter.__init__, key)})
+
+    def fit_function(self, fitter, fit_type):
+        """
+        Returns f(x, y) fitting the fit type from x[0], by Fitter.fit or the fit function of the type.
+        """
+        if hasattr(fitter, "fit"):
+            return lambda x, y: fitter.fit(fit_type, x, y, x[0])
+        method = getattr(fitter, FIT_METHODS[fit_type])
+        return lambda x, y: method(x, y, x[0])
+
+    def fitted_sections(self, data, fitter, knees, fit_type="Double Exp. Decay"):
+        """
+        Sections between the knees fitted with the fit type, as kept by the measured tree.
+        """
+        ranges = list(zip(knees[:-1], knees[1:]))
+        if self.SectionTable is not None and hasattr(fitter, "fit_section"):
+            sections = self.SectionTable()
+            for idx, (from_x, to_x) in enumerate(ranges):
+                sections.append(from_x, to_x)
+                fitter.fit_section(data, sections, idx, fit_type)
+            return sections
+        fit = self.fit_function(fitter, fit_type)
+        sections = []
+        for from_x, to_x in ranges:
+            mask = (data['x'] >= from_x) & (data['x'] <= to_x)
+            section = {"From": from_x, "To": to_x, "Type": fit_type, "Comment": ""}
+            try:
+                params = fit(data['x'][mask], data['y'][mask])
+            except Exception:
+                params = None
+            if params is None:
+                section["Comment"] = "error"
+            else:
+                section.update({name: np.nan for name in PARAM_NAMES})
+                section.update(zip(PARAM_NAMES, params))
+            sections.append(section)
+        return sections
+
+    def t90_sections(self, rows):
+        """
+        Sections of the given fields as a SectionTable, or a list of dicts without it.
+        """
+        if self.SectionTable is None:
+            return [dict(row, From=600.0 * idx, To=600.0 * (idx + 1), Comment="") for idx, row in enumerate(rows)]
+        sections = self.SectionTable(capacity=len(rows))
+        for idx, row in enumerate(rows):
+            section = sections.append(600.0 * idx, 600.0 * (idx + 1))
+            for name, value in row.items():
+                section[name] = value
+        return sections
+
+
+class Benchmark:
+    """
+    Collects timings of benchmarks as records of the JSON results.
+    """
+
+    def __init__(self, repeat=5):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, func, repeat=None, **params):
+        """
+        Calls func() repeatedly and records its wall times under the name and params.
+        Returns the value of the last call. A benchmark failing in the measured tree
+        (e.g. an older version) is reported and not recorded.
+        """
+        times = []
+        value = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            try:
+                value = func()
+            except Exception as e:
+                print(f"{name:<24} {format_params(params):<56} failed: {e!r}")
+                return None
+            times.append(time.perf_counter() - start)
+        record = {"name": name, "params": params, "repeat": len(times),
+                  "min": min(times), "median": float(np.median(times)), "mean": float(np.mean(times))}
+        self.results.append(record)
+        print(f"{name:<24} {format_params(params):<56} {record['min'] * 1e3:10.3f} ms")
+        return value
+
+
+def format_params(params):
+    return ", ".join(f"{key}={value}" for key, value in params.items())
+
+
+def result_key(record):
+    return record["name"], format_params(record["params"])
+
+
+def synthetic_section(n, seed=SEED):
+    """
+    Double exponential decay with noise, x from 0 to 600 s, the same for the same n and seed.
+    """
+    rng = np.random.default_rng(seed + n)
+    x = np.linspace(0.0, 600.0, n)
+    y = 1e5 + 4e4 * np.exp(-x / 20.0) + 2e4 * np.exp(-x / 150.0)
+    return x, y + rng.normal(scale=200.0, size=n)
+
+
+def pulse_knees(data, min_samples=5):
+    """
+    Knees at the edges of the concentration pulses, found here (not by KneeFinder) so that
+    every measured tree gets the same sections: the state switches at 75 % of the step up
+    and at 25 % down, edges closer than min_samples points are merged.
+    """
+    x, c = data['x'], np.asarray(data['c'], dtype=float)
+    low, high = np.nanpercentile(c, [5, 95])
+    edges = []
+    if high > low:
+        up, down = low + 0.75 * (high - low), low + 0.25 * (high - low)
+        on = c[0] >= up
+        for idx, value in enumerate(c):
+            if (not on and value >= up) or (on and value <= down):
+                on = not on
+                if not edges or idx - edges[-1] >= min_samples:
+                    edges.append(idx)
+    return [x[0]] + [x[idx] for idx in edges if 0 < idx < len(x) - 1] + [x[-1]]
+
+
+def largest(files):
+    return max(files, key=os.path.getsize)
+
+
+def real_sections(data, knees, count=3):
+    """
+    Returns x/y of count sections between the knees, from the shortest to the longest.
+    """
+    starts = np.searchsorted(data['x'], knees[:-1], side='left')
+    stops = np.searchsorted(data['x'], knees[1:], side='right')
+    order = np.argsort(stops - starts)
+    order = order[(stops - starts)[order] > 10]
+    picks = order[np.unique(np.linspace(0, len(order) - 1, count).astype(int))] if len(order) else []
+    return [(data['x'][starts[i]:stops[i]], data['y'][starts[i]:stops[i]]) for i in picks]
+
+
+def render_host(mods, data, sections, knees, fitter):
+    """
+    Minimal stand-in of the App with an Agg canvas, App.plot_data/plot_fits are bound to it.
+    """
+    host = types.SimpleNamespace()
+    host.figure = Figure(figsize=(10, 6), dpi=100)
+    host.canvas = FigureCanvasAgg(host.figure)
+    host.plot_axes = host.figure.add_subplot(111)
+    if mods.BlitManager is not None:
+        host.blit = mods.BlitManager(host.canvas)
+    host.data, host.sections, host.knees, host.fitter = data, sections, knees, fitter
+    host.knee_annotations = []
+    host.decimated_lines = []
+    host.highlight_rectangle = None
+    host.display_var = types.SimpleNamespace(get=lambda: "Whole plot")
+    for name in ("plot_data", "plot_knees", "plot_fits", "update_decimation"):
+        if hasattr(mods.App, name):
+            setattr(host, name, types.MethodType(getattr(mods.App, name), host))
+    return host
+
+
+def bench_loading(bench, mods, files):
+    loader = mods.loader()
+    for path in files:
+        bench.run("load_xyc", lambda: loader.load_xyc(path), file=os.path.basename(path))
+
+
+def bench_fitting(bench, mods, files, solvers):
+    sections = [("synthetic", n, synthetic_section(n)) for n in SYNTHETIC_LENGTHS]
+    if files:
+        data = mods.load(largest(files))
+        if data is not None:
+            sections += [("real", len(x), (x, y)) for x, y in real_sections(data, pulse_knees(data))]
+    for solver in solvers:
+        if solver not in mods.solvers():
+            print(f"Solver {solver} is not available, skipped.")
+            continue
+        fitter = mods.fitter(solver)
+        for source, n, (x, y) in sections:
+            for fit_type in FIT_TYPES:
+                fit = mods.fit_function(fitter, fit_type)
+                bench.run("fit", lambda: fit(x, y), model=fit_type, solver=solver, source=source, n=n)
+
+
+def bench_t90(bench, mods, count=1000):
+    fitter = mods.fitter()
+    rng = np.random.default_rng(SEED)
+    rows = []
+    for _ in range(count):
+        A1, A2 = rng.uniform(1e3, 5e4, 2)
+        tau1, tau2 = rng.uniform(1.0, 300.0, 2)
+        rows.append({"Type": "Double Exp. Decay", "y0": 1e5, "prev_y0": 1e5 + rng.uniform(1e4, 1e5),
+                     "A1": A1, "A2": A2, "tau1": tau1, "tau2": tau2})
+    sections = mods.t90_sections(rows)
+
+    def each():
+        for section in sections:
+            fitter.calculate_t90(section)
+
+    bench.run("calculate_t90", each, sections=count)
+    if hasattr(fitter, "response_times") and mods.SectionTable is not None:
+        bench.run("response_times", lambda: fitter.response_times(sections.data), sections=count)
+
+
+def bench_rendering(bench, mods, files):
+    if not files or mods.App is None:
+        return
+    fitter = mods.fitter()
+    path = largest(files)
+    data = mods.load(path)
+    if data is None:
+        return
+    knees = pulse_knees(data)
+    sections = mods.fitted_sections(data, fitter, knees)
+    host = render_host(mods, data, sections, knees, fitter)
+    file = os.path.basename(path)
+    bench.run("plot_data", host.plot_data, file=file, points=len(data['x']), sections=len(sections))
+    bench.run("plot_fits", host.plot_fits, file=file, points=len(data['x']), sections=len(sections))
+
+
+def environment(repo):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "scipy": scipy.__version__,
+            "matplotlib": matplotlib.__version__}
+
+
+def compare(results, baseline_path):
+    """
+    Prints the ratio of best times of the results to the baseline (< 1 is faster).
+    """
+    with open(baseline_path) as file:
+        baseline = {result_key(record): record for record in json.load(file)["results"]}
+    print(f"\nCompared with {baseline_path} (best time, new / old):")
+    for record in results:
+        old = baseline.get(result_key(record))
+        if old is None or old["min"] == 0:
+            continue
+        ratio = record["min"] / old["min"]
+        print(f"{record['name']:<24} {format_params(record['params']):<56} {ratio:8.2f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Response Fitter benchmarks")
+    parser.add_argument("--repo", default=BASE_DIR, help="checkout whose modules are measured (default: this one)")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "test_data"), help="directory with data files")
+    parser.add_argument("--output", default="bench.json", help="JSON file with the results")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats of every benchmark (default: 5)")
+    parser.add_argument("--only", nargs="+", choices=["load", "fit", "t90", "render"],
+                        help="run only some groups of benchmarks")
+    parser.add_argument("--solver", nargs="+", choices=SOLVERS,
+                        help="solvers of the fitting benchmarks (default: all of the measured tree)")
+    parser.add_argument("--compare", metavar="JSON", help="results of another commit to compare with")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    repo = os.path.abspath(args.repo)
+    mods = Modules(repo)
+    files = sorted(set(glob.glob(os.path.join(args.data, "*.txt")) + glob.glob(os.path.join(args.data, "*.csv"))))
+    groups = args.only or ["load", "fit", "t90", "render"]
+    bench = Benchmark(args.repeat)
+    if "load" in groups:
+        bench_loading(bench, mods, files)
+    if "fit" in groups:
+        bench_fitting(bench, mods, files, args.solver or mods.solvers())
+    if "t90" in groups:
+        bench_t90(bench, mods)
+    if "render" in groups:
+        bench_rendering(bench, mods, files)
+
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment(repo), "results": bench.results}, file, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(bench.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,48 @@
 # main.py
 
-from modules.app import App
+import argparse
+import multiprocessing
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Response Fitter")
+    parser.add_argument("--batch", metavar="PATH",
+                        help="fit a data file, the data files in a ZIP archive, or all data files in a directory without GUI")
+    parser.add_argument("--fit-type", default="single", choices=["single", "double", "aux"],
+                        help="fit curve used for all sections (default: single)")
+    parser.add_argument("--knees", help="semicolon delimited knees, e.g. \"0;600;1200\", or \"auto\" to find them in every file")
+    parser.add_argument("--project", help="saved project (.dat) whose section ranges are reused")
+    parser.add_argument("--pattern", nargs="+", default=["*.txt", "*.csv"],
+                        help="file patterns searched in the batch directory (add \"*.zip\" to include archives)")
+    parser.add_argument("--output", default="fits.csv", help="output table (.csv or .xlsx)")
+    parser.add_argument("--solver", default="curve_fit", choices=["curve_fit", "varpro"],
+                        help="exponential fits jointly by curve_fit (default, fastest) or by variable projection "
+                             "(about 1.5x slower, for sections where curve_fit fails)")
+    parser.add_argument("--loss", default="linear", choices=["linear", "soft_l1", "huber"],
+                        help="robust loss reducing the influence of outliers (default: linear = least squares)")
+    parser.add_argument("--max-nfev", type=int, default=10000,
+                        help="maximum number of function evaluations of a fit (default: 10000)")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="wall time limit of a fit, the best parameters found so far are kept (default: none)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="parse every file without reading or writing the parsed-data cache")
+    parser.add_argument("--workers", type=int, help="number of fitting processes (default: all cores)")
+    parser.add_argument("--compare-jac", action="store_true",
+                        help="compare analytic and finite-difference Jacobians instead of writing fits")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # worker processes of the frozen (PyInstaller) executable
+    args = parse_args()
+    if args.batch:
+        from modules.batch import run_batch
+        sys.exit(run_batch(args))
+
+    from modules.app import App
     app = App(BASE_DIR)
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
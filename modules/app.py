@@ -9,8 +9,18 @@ from matplotlib.widgets import SpanSelector
 import numpy as np
 import os
 
-from modules.data_loader import DataLoader
+from modules.blit import BlitManager
+from modules.data_loader import DataLoader, FormatRegistry, TailReader
+from modules.decimate import DecimatedCurve, DecimatedLine
+from modules.executor import FitExecutor
 from modules.fitter import Fitter
+from modules.instruments import instruments
+from modules.knees import KneeFinder
+from modules.sections import COLUMNS, SectionTable, section_slice
+
+FIT_POLL_MS = 50  # Interval of checking the background fitting for finished sections
+FOLLOW_POLL_MS = 2000  # Interval of checking a followed data file for new rows
+DIAGNOSTICS_POLL_MS = 1000  # Interval of refreshing the timings while they are recorded
 
 class App(tk.Tk):
     def __init__(self, BASE_DIR):
@@ -21,22 +31,44 @@ class App(tk.Tk):
         self.dialog_icon = os.path.join(BASE_DIR, "icons", "app_bw.ico")
         self.iconbitmap(False, icon_path)
 
-        self.data = None  # Dictionary to hold 'x', 'y', 'c', 'xlabel', 'ylabel', 'zlabel'
+        self.data = None  # Dictionary to hold 'x', 'y', 'c', optional 'w', 'xlabel', 'ylabel', 'zlabel'
         self.knees = []  # List to hold identified knees
         self.knee_annotations = []
-        self.sections = []  # List to hold sections for fitting
-        self.fits = []  # List to hold fitting results
+        self.sections = SectionTable()  # Sections for fitting, together with their fitting results
         self.loaded_filename = ""  # To store the name of the loaded file
+        self.tail_reader = None  # Reader of the followed (growing) data file
+        self.datasets = None  # All data sets opened together, self.data is one of them
+        # Dialects of instruments detected in opened files are remembered between sessions
+        self.format_registry = FormatRegistry(os.path.join(os.path.expanduser("~"), ".responsefitter_formats.json"))
         self.highlight_rectangle = None  # To keep track of the highlight rectangle
+        self.decimated_lines = []  # Data traces drawn as min/max envelope of the visible range
+        self.fit_lines = []  # Fitted curves evaluated at the plotted points only
 
 
-        self.columns = ("#", "From", "To", "Type", "y0", "A1", "tau1", "A2", "tau2", "tau90", "Comment")
+        self.columns = COLUMNS
         self.columns_formats = ("{:d}", "{:.2f}", "{:.2f}", "{}", "{:.5e}", "{:.5G}", "{:.5G}", "{:.5G}", "{:.5G}", "{:.3G}", "{}")
 
         self.fitter = Fitter()
+        # Worker processes are started on first "Fit All Sections" with enough sections
+        self.fit_executor = FitExecutor(self.fitter)
+        self.fit_job = None  # Sections being fitted in the background
+        self.refit_job = None  # Refit of the followed section running in the background
+        self.refit_pending = None  # Index of the section to refit again when refit_job is done
+        self.knee_finder = KneeFinder()
+        self.diagnostics_window = None  # Timings of the hot paths, opened by "Diagnostics"
+        self.diagnostics_poll = None  # Pending refresh of the timings
 
         self.create_widgets()
 
+    @property
+    def fits(self):
+        """Fitting results are kept in the section table."""
+        return self.sections
+
+    def destroy(self):
+        self.fit_executor.shutdown()
+        super().destroy()
+
     def create_widgets(self):
         # Top frame with buttons
         top_frame = tk.Frame(self)
@@ -49,20 +81,31 @@ class App(tk.Tk):
         open_button = tk.Button(left_button_frame, text="Open Data (Delimited)", command=self.open_data)
         open_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        # Switching between data sets opened together
+        self.dataset_var = tk.StringVar()
+        self.dataset_combo = ttk.Combobox(left_button_frame, textvariable=self.dataset_var, state="disabled", width=40)
+        self.dataset_combo.bind("<<ComboboxSelected>>", lambda event: self.show_dataset(self.dataset_combo.current()))
+        self.dataset_combo.pack(side=tk.LEFT, padx=5, pady=5)
+
         crop_button = tk.Button(left_button_frame, text="Crop Data", command=self.crop_data)
         crop_button.pack(side=tk.LEFT, padx=5, pady=5)
 
+        self.follow_var = tk.BooleanVar(value=False)
+        follow_check = tk.Checkbutton(left_button_frame, text="Follow File", variable=self.follow_var,
+                                      command=self.on_follow_changed)
+        follow_check.pack(side=tk.LEFT, padx=5, pady=5)
+
         # Right-aligned buttons
         right_button_frame = tk.Frame(top_frame)
         right_button_frame.pack(side=tk.RIGHT)
 
-        save_button = tk.Button(right_button_frame, text="Save Project", command=self.save_project, state="disabled")
+        save_button = tk.Button(right_button_frame, text="Save Project", command=self.save_project)
         save_button.pack(side=tk.RIGHT, padx=5, pady=5)
 
         export_plot_button = tk.Button(right_button_frame, text="Export Plot", command=self.export_plot)
         export_plot_button.pack(side=tk.RIGHT, padx=5, pady=5)
 
-        export_fits_button = tk.Button(right_button_frame, text="Export Fits", command=self.export_fits, state="disabled")
+        export_fits_button = tk.Button(right_button_frame, text="Export Fits", command=self.export_fits)
         export_fits_button.pack(side=tk.RIGHT, padx=5, pady=5)
 
         # Main frame
@@ -87,6 +130,12 @@ class App(tk.Tk):
         # Pack the canvas
         self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         self.canvas.draw()
+        self.canvas.mpl_connect('resize_event', lambda event: self.update_decimation())
+        # Cursors, highlight, knees and fits are redrawn over the cached data traces
+        self.blit = BlitManager(self.canvas)
+        # Full draws and overlay redraws are timed when diagnostics are recorded
+        self.canvas.draw = instruments.wrap("canvas.draw", self.canvas.draw)
+        self.blit.update = instruments.wrap("blit.update", self.blit.update)
 
         # Add cursors A and B using SpanSelector
         self.cursor_A = None
@@ -100,7 +149,7 @@ class App(tk.Tk):
         right_frame.pack(side=tk.RIGHT, fill=tk.Y)
 
 
-        find_knees_button = tk.Button(right_frame, text="Find Knees", command=self.find_knees, state="disabled")
+        find_knees_button = tk.Button(right_frame, text="Find Knees", command=self.find_knees)
         find_knees_button.pack(padx=5, pady=5, fill=tk.X)
 
         edit_knees_button = tk.Button(right_frame, text="Edit Knees", command=self.edit_knees)
@@ -126,6 +175,20 @@ class App(tk.Tk):
             rb = tk.Radiobutton(right_frame, text=option, variable=self.fit_curve_var, value=option)
             rb.pack(anchor='w', padx=20)
 
+        self.varpro_var = tk.BooleanVar(value=False)
+        varpro_check = tk.Checkbutton(right_frame, text="Variable projection", variable=self.varpro_var,
+                                      command=self.on_solver_changed)
+        varpro_check.pack(anchor='w', padx=20)
+
+        loss_frame = tk.Frame(right_frame)
+        loss_frame.pack(anchor='w', padx=20)
+        tk.Label(loss_frame, text="Loss:").pack(side=tk.LEFT)
+        self.loss_var = tk.StringVar(value=self.fitter.loss)
+        loss_combo = ttk.Combobox(loss_frame, textvariable=self.loss_var, values=list(Fitter.LOSSES),
+                                  state="readonly", width=8)
+        loss_combo.pack(side=tk.LEFT, padx=5)
+        loss_combo.bind("<<ComboboxSelected>>", self.on_loss_changed)
+
         # RadioBox for Display
         display_label = tk.Label(right_frame, text="Display:")
         display_label.pack(padx=5, pady=(20, 5))
@@ -143,6 +206,9 @@ class App(tk.Tk):
         filter_data_button = tk.Button(right_frame, text="Filter Data", command=self.filter_data)
         filter_data_button.pack(padx=5, pady=5, fill=tk.X)
 
+        diagnostics_button = tk.Button(right_frame, text="Diagnostics", command=self.show_diagnostics)
+        diagnostics_button.pack(side=tk.BOTTOM, padx=5, pady=5, fill=tk.X)
+
         # Status bar at the bottom
         status_frame = tk.Frame(self, bd=1, relief=tk.SUNKEN)
         status_frame.pack(side=tk.BOTTOM, fill=tk.X)
@@ -154,6 +220,10 @@ class App(tk.Tk):
         self.status_label_info = tk.Label(status_frame, text="Ready", bd=1, relief=tk.SUNKEN, anchor=tk.W)
         self.status_label_info.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
+        # Latest measured step, shown while diagnostics are recorded
+        self.status_label_timing = tk.Label(status_frame, text="", bd=1, relief=tk.SUNKEN, anchor=tk.W, width=30)
+        self.status_label_timing.pack(side=tk.LEFT)
+
         # Resize grip (the third section)
         self.status_resize_grip = ttk.Sizegrip(status_frame)
         self.status_resize_grip.pack(side=tk.RIGHT)
@@ -180,6 +250,9 @@ class App(tk.Tk):
         fit_all_button = tk.Button(table_buttons, text="Fit All Sections", command=self.fit_all_sections)
         fit_all_button.pack(padx=5, pady=5, side=tk.LEFT)
 
+        self.cancel_fit_button = tk.Button(table_buttons, text="Cancel", command=self.cancel_fit, state="disabled")
+        self.cancel_fit_button.pack(padx=5, pady=5, side=tk.LEFT)
+
         copy_table_button = tk.Button(table_buttons, text="Copy All Fits", command=self.copy_whole_table)
         copy_table_button.pack(padx=5, pady=5, side=tk.RIGHT)
 
@@ -239,21 +312,38 @@ class App(tk.Tk):
         self.update_status_info("Whole table copied to clipboard.")
 
     def open_data(self):
-        filepath = filedialog.askopenfilename(filetypes=[("Delimited files", "*.csv;*.txt"), ("All files", "*.*")])
-        if filepath:
-            loader = DataLoader()
-            self.data = loader.load_xyc(filepath)
-            if self.data is not None:
-                self.plot_data()
-                # self.add_cursors()
-                self.clear_fits()
-                self.loaded_filename = filepath  # Store the filename
-                # Update the status bar with the file name
-                self.status_label_file.config(text=f"Loaded file: {filepath}")
-                self.update_status_info("Data loaded successfully.")
+        # More files (or ZIP archives) can be selected, they are loaded in parallel
+        filepaths = filedialog.askopenfilenames(filetypes=[("Delimited files", "*.csv;*.txt"), ("ZIP archives", "*.zip"),
+                                                           ("All files", "*.*")])
+        if filepaths:
+            loader = DataLoader(formats=self.format_registry)
+            datasets = loader.load_many(list(filepaths))
+            if len(datasets):
+                self.datasets = datasets
+                self.dataset_combo.config(values=datasets.names, state="readonly" if len(datasets) > 1 else "disabled")
+                self.show_dataset(0)
+                if datasets.failed:
+                    self.update_status_info(f"Loaded {len(datasets)} data sets, failed to load {len(datasets.failed)} files.")
             else:
                 self.update_status_info("Failed to load data. Check the file format.")
 
+    def show_dataset(self, idx):
+        """
+        Shows one of the opened data sets. The sections are kept for comparing the runs, their fits are cleared.
+        """
+        self.cancel_fit()
+        self.stop_following()
+        self.data = self.datasets[idx]
+        self.dataset_var.set(self.datasets.names[idx])
+        self.plot_data()
+        # self.add_cursors()
+        self.clear_fits()
+        self.refresh_table()
+        self.loaded_filename = self.datasets.paths[idx]  # Store the filename
+        # Update the status bar with the file name
+        self.status_label_file.config(text=f"Loaded file: {self.loaded_filename}")
+        self.update_status_info("Data loaded successfully.")
+
     def save_project(self):
         if self.fits:
             filepath = filedialog.asksaveasfilename(defaultextension=".dat", filetypes=[("DAT Files", "*.dat")])
@@ -272,7 +362,13 @@ class App(tk.Tk):
             filepath = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG Image", "*.png")])
             if filepath:
                 try:
-                    self.figure.savefig(filepath, dpi=200)  # Double resolution (standard 100 dpi)
+                    # Double resolution (standard 100 dpi), the data traces are decimated accordingly
+                    self.update_decimation(scale=2)
+                    try:
+                        with self.blit.static():
+                            self.figure.savefig(filepath, dpi=200)
+                    finally:
+                        self.update_decimation()
                     # Update status bar instead of message box
                     self.update_status_info("Plot exported successfully.")
                 except Exception as e:
@@ -302,8 +398,14 @@ class App(tk.Tk):
         except:
             self.plot_axes2 = self.plot_axes.twinx()
 
-        self.plot_axes.plot(self.data['x'], self.data['y'], label=self.data['ylabel'], color='blue')
-        self.plot_axes2.plot(self.data['x'], self.data['c'], label=self.data['zlabel'], color='green')
+        # Data traces are decimated to the pixel width of the axes and recalculated on zoom/pan
+        self.decimated_lines = []
+        n_bins = self.plot_axes.bbox.width
+        for axes, key, label, color in ((self.plot_axes, 'y', 'ylabel', 'blue'), (self.plot_axes2, 'c', 'zlabel', 'green')):
+            decimated = DecimatedLine(self.data['x'], self.data[key])
+            decimated.line, = axes.plot(*decimated.view((-np.inf, np.inf), n_bins), label=self.data[label], color=color)
+            self.decimated_lines.append(decimated)
+        self.plot_axes.callbacks.connect('xlim_changed', lambda axes: self.update_decimation())
 
         self.plot_axes.set_xlabel(self.data['xlabel'])
         self.plot_axes.set_ylabel(self.data['ylabel'], color='blue')
@@ -319,26 +421,35 @@ class App(tk.Tk):
 
         # Re-plot highlight rectangle
         if hasattr(self, 'highlight_rectangle') and self.highlight_rectangle is not None:
-            from_x = self.highlight_rectangle.xy[0][0]
-            to_x = self.highlight_rectangle.xy[2][0]
-            self.highlight_rectangle = self.plot_axes.axvspan(
-                from_x, to_x, color='yellow', alpha=0.3, zorder=0
-            )
+            # The same patch is added back (axvspan returns Rectangle or Polygon depending on matplotlib)
+            self.plot_axes.add_patch(self.highlight_rectangle)
+            self.blit.add(self.highlight_rectangle)
 
         self.canvas.draw()
 
+    def update_decimation(self, scale=1):
+        """Recalculates decimated data traces for the current x-limits and axes width."""
+        if not self.decimated_lines:
+            return
+        xlim = self.plot_axes.get_xlim()
+        n_bins = self.plot_axes.bbox.width * scale
+        for decimated in self.decimated_lines + self.fit_lines:
+            decimated.update(xlim, n_bins)
+
     def crop_data(self):
         if self.cursor_A is not None and self.cursor_B is not None:
+            self.cancel_fit()
+            self.stop_following()  # Cropped data no longer correspond to the file
             A = min(self.cursor_A, self.cursor_B)
             B = max(self.cursor_A, self.cursor_B)
             if A == B:
                 self.update_status_info("Cursor A and B positions are the same.")
                 return
 
-            # Create mask for cropping
-            cropped_mask = (self.data['x'] >= A) & (self.data['x'] <= B)
+            # Index range for cropping
+            cropped_slice = section_slice(self.data['x'], A, B)
 
-            if not cropped_mask.any():
+            if cropped_slice.stop == cropped_slice.start:
                 self.update_status_info("No data in the selected range.")
                 return
 
@@ -347,24 +458,27 @@ class App(tk.Tk):
                 self.update_status_info("Data inconsistency before cropping.")
                 return
 
-            # Apply mask to 'x', 'y', and 'c'
-            cropped_x = self.data['x'][cropped_mask] - A  # Shift 'x' to start at 0
-            cropped_y = self.data['y'][cropped_mask]
-            cropped_c = self.data['c'][cropped_mask]
+            # Apply slice to 'x', 'y', and 'c', copies release the memory of the uncropped data
+            cropped_x = self.data['x'][cropped_slice] - A  # Shift 'x' to start at 0
+            cropped_y = self.data['y'][cropped_slice].copy()
+            cropped_c = self.data['c'][cropped_slice].copy()
 
             # Ensure the lengths match after cropping
             if not (len(cropped_x) == len(cropped_y) == len(cropped_c)):
                 self.update_status_info("Data inconsistency after cropping.")
                 return
 
-            # Update the data
+            # Update the data, cached fits belong to the uncropped data
+            self.fitter.clear_cache()
             self.data['x'] = cropped_x
             self.data['y'] = cropped_y
             self.data['c'] = cropped_c
+            if self.data.get('w') is not None:
+                self.data['w'] = self.data['w'][cropped_slice].copy()
 
             # Clear existing knees and sections
             self.knees = []
-            self.sections = []
+            self.sections.clear()
             self.clear_fits()
             self.refresh_table()
 
@@ -385,11 +499,17 @@ class App(tk.Tk):
 
 
     def fit_selected_section(self):
+        if self.fit_job is not None:
+            self.update_status_info("Fitting of all sections is running.")
+            return
         selected_item = self.tree.selection()
         if selected_item:
             item_index = self.tree.index(selected_item[0])
+            # A background refit of the followed section would overwrite this fit, it is started
+            # again with the next data
+            self.cancel_refit()
             section = self.sections[item_index]
-            self.fit_section(section, item_index)
+            self.fit_section(section, item_index)  # Also updates t90 of the following section
             self.refresh_table()
             self.plot_fits()  # Update the fits on the plot
             self.update_status_info(f"Section {section['#']} fitted.")
@@ -400,70 +520,165 @@ class App(tk.Tk):
         if not self.sections:
             self.update_status_info("No sections to fit.")
             return
-        for idx, section in enumerate(self.sections):
-            self.fit_section(section, idx)
-        self.refresh_table()
+        if self.fit_job is not None:
+            self.update_status_info("Fitting of all sections is running.")
+            return
+        fit_type = self.fit_curve_var.get()  # Use the selected fit type
+        # Fits run in the background, finished sections are stored and shown by poll_fit_job
+        self.fit_job = self.fit_executor.start(self.data, self.sections, fit_type)
+        self.cancel_fit_button.config(state="normal")
+        self.update_status_info(f"Fitting sections: 0/{len(self.fit_job)}")
+        self.after(FIT_POLL_MS, self.poll_fit_job, self.fit_job)
+
+    def poll_fit_job(self, job):
+        if job is not self.fit_job:
+            return  # Cancelled
+        for idx in job.poll():
+            self.refresh_row(idx)
+        if job.done():
+            self.finish_fit_job("All sections have been fitted.")
+        else:
+            self.update_status_info(f"Fitting sections: {job.stored}/{len(job)}")
+            self.after(FIT_POLL_MS, self.poll_fit_job, job)
+
+    def cancel_fit(self):
+        self.cancel_refit()
+        if self.fit_job is not None:
+            self.fit_job.cancel()
+            self.finish_fit_job(f"Fitting cancelled, {self.fit_job.stored} of {len(self.fit_job)} sections fitted.")
+
+    def finish_fit_job(self, message):
+        self.fit_job = None
+        self.cancel_fit_button.config(state="disabled")
         self.plot_fits()  # Plot fits after fitting all sections
-        self.update_status_info("All sections have been fitted.")
-    def update_status_info(self, message):
-        """Update the status bar with the latest executed command."""
-        self.status_label_info.config(text=message)
+        self.update_status_info(message)
 
-    def fit_section(self, section, idx):
+    def on_follow_changed(self):
+        if not self.follow_var.get():
+            self.stop_following()
+            self.update_status_info("Stopped following the file.")
+            return
+        if not self.loaded_filename:
+            self.follow_var.set(False)
+            self.update_status_info("No file loaded to follow.")
+            return
         try:
-            from_x = section["From"]
-            to_x = section["To"]
-            # Extract data for the current section
-            mask = (self.data['x'] >= from_x) & (self.data['x'] <= to_x)
-            x_data = self.data['x'][mask]
-            y_data = self.data['y'][mask]
+            # The file is read once more, from now on only its new rows are read
+            self.tail_reader = TailReader(self.loaded_filename, DataLoader(use_cache=False, formats=self.format_registry))
+            self.tail_reader.update()
+        except Exception as e:
+            self.stop_following()
+            self.update_status_info(f"Failed to follow the file: {e}")
+            return
+        self.data = self.tail_reader.data()
+        self.plot_data()
+        self.update_status_info(f"Following the file, {len(self.data['x'])} rows.")
+        self.after(FOLLOW_POLL_MS, self.poll_follow, self.tail_reader)
+
+    def stop_following(self):
+        self.tail_reader = None
+        self.follow_var.set(False)
+
+    def poll_follow(self, tail_reader):
+        if tail_reader is not self.tail_reader:
+            return  # Stopped
+        try:
+            new_rows = tail_reader.update()
+        except Exception as e:
+            self.stop_following()
+            self.update_status_info(f"Stopped following the file: {e}")
+            return
+        if new_rows:
+            self.extend_data(new_rows)
+        self.after(FOLLOW_POLL_MS, self.poll_follow, tail_reader)
 
-            if len(x_data) < 2:
-                section["Comment"] = "Insufficient data"
-                return
+    def extend_data(self, new_rows):
+        """
+        Shows rows appended to the followed file and refits the section at the end of the data.
+        """
+        old_end = self.data['x'][-1] if len(self.data['x']) else -np.inf
+        self.data = self.tail_reader.data()
+        if new_rows < 0:
+            # The file was rewritten
+            self.plot_data()
+            self.update_status_info(f"The file was rewritten, {len(self.data['x'])} rows.")
+            return
 
-            x0 = x_data.min()
-            fit_type = self.fit_curve_var.get()  # Use the selected fit type
+        x = self.data['x']
+        for decimated, key in zip(self.decimated_lines, ('y', 'c')):
+            decimated.set_data(x, self.data[key])
+        if self.display_var.get() == "Whole plot":
+            # The fitted curves continue to the new end of the data
+            self.plot_fits()
+        xlim = self.plot_axes.get_xlim()
+        if xlim[1] >= old_end:
+            # The end of the data was in view, the view is extended to the new data
+            self.plot_axes.set_xlim(xlim[0], x[-1])
+        else:
+            self.update_decimation()
+        for axes in (self.plot_axes, self.plot_axes2):
+            axes.relim()
+            axes.autoscale_view(scalex=False)
 
-            section["Type"] = fit_type
+        self.refit_open_section(old_end)
+        self.canvas.draw_idle()
+        self.update_status_info(f"{new_rows} new rows, data up to {x[-1]:.2f}.")
 
-            if fit_type == "Single Exp. Decay":
-                params = self.fitter.single_exp_decay(x_data, y_data, x0)
-                if params is not None:
-                    section["y0"], section["A1"], section["tau1"] = [f"{p:.3E}" for p in params]
-                    section["A2"] = ""
-                    section["tau2"] = ""
-                else:
-                    section["Comment"] = "error"
-            elif fit_type == "Double Exp. Decay":
-                params = self.fitter.double_exp_decay(x_data, y_data, x0)
-                if params is not None:
-                    section["y0"], section["A1"], section["tau1"], section["A2"], section["tau2"] = [
-                        f"{p:.3E}" for p in params]
-                    section["tau90"] = ""
-                else:
-                    section["Comment"] = "error"
-            elif fit_type == "Aux":
-                params = self.fitter.auxiliary(x_data, y_data, x0)
-                if params is not None:
-                    section["y0"], section["A1"] = [f"{p:.3E}" for p in params]
-                    section["tau1"] = ""
-                    section["A2"] = ""
-                    section["tau2"] = ""
-                    section["tau90"] = ""
-                else:
-                    section["Comment"] = "error"
+    def refit_open_section(self, old_end):
+        """
+        Extends the section reaching the previous end of the data to the new end
+        and refits it in the background, if it has been fitted. Other sections are not affected.
+        """
+        if not len(self.sections) or self.fit_job is not None:
+            return
+        idx = int(np.argmax(self.sections.data["To"]))
+        section = self.sections[idx]
+        if section["To"] < old_end:
+            return
+        section["To"] = self.data['x'][-1]
+        self.refresh_row(idx)
+        if section["Type"]:
+            self.start_refit(idx)
+
+    def start_refit(self, idx):
+        """
+        Refits the section in the background with its own fit type. If a refit is running,
+        the section is refitted once more when it is done, with the data appended meanwhile.
+        """
+        if self.refit_job is not None:
+            self.refit_pending = idx
+            return
+        fit_type = self.sections[idx]["Type"]  # Keeps the model, the selected fit curve may differ
+        self.refit_job = self.fit_executor.start(self.data, self.sections, fit_type, indices=[idx])
+        self.after(FIT_POLL_MS, self.poll_refit_job, self.refit_job)
+
+    def poll_refit_job(self, job):
+        if job is not self.refit_job:
+            return  # Cancelled
+        for row in job.poll():
+            self.refresh_row(row)
+        if not job.done():
+            self.after(FIT_POLL_MS, self.poll_refit_job, job)
+            return
+        self.refit_job = None
+        self.plot_fits()
+        if self.refit_pending is not None:
+            idx, self.refit_pending = self.refit_pending, None
+            self.start_refit(idx)
 
-            if ((idx+1) < len(self.sections)): #set prev_y0 for following section
-                next_section = self.sections[idx+1]
-                next_section["prev_y0"] = params[0]
-            if (idx==0):  # first section does not have prev_y0
-                section["prev_y0"] = y_data[0]
+    def cancel_refit(self):
+        if self.refit_job is not None:
+            self.refit_job.cancel()
+        self.refit_job = None
+        self.refit_pending = None
 
-            self.fitter.calculate_t90(section)
+    def update_status_info(self, message):
+        """Update the status bar with the latest executed command."""
+        self.status_label_info.config(text=message)
 
-        except Exception as e:
-            section["Comment"] = f"Exception: {e}"
+    def fit_section(self, section, idx):
+        fit_type = self.fit_curve_var.get()  # Use the selected fit type
+        return self.fitter.fit_section(self.data, self.sections, idx, fit_type)
 
     def _add_cursors(self):
         """
@@ -491,89 +706,105 @@ class App(tk.Tk):
     def on_select(self, xmin, xmax):
         # Remove old cursor lines
         if self.cursor_A_line:
-            self.cursor_A_line.remove()
+            self.blit.remove(self.cursor_A_line)
         if self.cursor_B_line:
-            self.cursor_B_line.remove()
+            self.blit.remove(self.cursor_B_line)
 
         # Add new vertical lines for cursors A and B
-        self.cursor_A_line = self.plot_axes.axvline(
+        self.cursor_A_line = self.blit.add(self.plot_axes.axvline(
             x=xmin, color='red', linestyle='--'
-        )
-        self.cursor_B_line = self.plot_axes.axvline(
+        ))
+        self.cursor_B_line = self.blit.add(self.plot_axes.axvline(
             x=xmax, color='red', linestyle='--'
-        )
+        ))
 
         self.cursor_A = xmin
         self.cursor_B = xmax
 
-        # Redraw the canvas to show updated cursors
-        self.canvas.draw()
+        # Redraw only the overlays to show updated cursors
+        self.blit.update()
+
+    def format_section(self, section):
+        formatted_values = []
+        for column, fmt in zip(self.columns, self.columns_formats):
+            value = section[column]
+            if fmt == "{}":
+                # String format
+                formatted_value = fmt.format(value)
+            elif fmt == "{:d}":
+                # Integer format
+                formatted_value = fmt.format(int(value))
+            elif np.isnan(value):
+                # Not fitted or not used by the fit type
+                formatted_value = ""
+            else:
+                # Float format
+                formatted_value = fmt.format(value)
+            formatted_values.append(formatted_value)
+        return formatted_values
 
     def refresh_table(self):
         for item in self.tree.get_children():
             self.tree.delete(item)
         for section in self.sections:
-            formatted_values = []
-            for value, fmt in zip(section.values(), self.columns_formats):
-                try:
-                    if value == "" or value is None:
-                        formatted_value = ""
-                    else:
-                        # Determine the appropriate type casting based on the format
-                        if fmt == "{}":
-                            # String format, no casting needed
-                            formatted_value = fmt.format(value)
-                        elif fmt == "{:d}":
-                            # Integer format
-                            formatted_value = fmt.format(int(float(value)))
-                        else:
-                            # Float format
-                            formatted_value = fmt.format(float(value))
-                except (ValueError, TypeError) as e:
-                    # If formatting fails, use the original value as a string
-                    formatted_value = str(value)
-                formatted_values.append(formatted_value)
-            self.tree.insert("", "end", values=formatted_values)
+            self.tree.insert("", "end", values=self.format_section(section))
+
+    def refresh_row(self, idx):
+        """Updates a single row of the table, e.g. when its section has been fitted."""
+        item = self.tree.get_children()[idx]
+        self.tree.item(item, values=self.format_section(self.sections[idx]))
 
     def plot_fits(self):
         # Remove previous fit lines
         for line in self.plot_axes.lines[:]:
             if getattr(line, '_is_fit', False):
-                line.remove()
+                self.blit.remove(line)
 
+        self.fit_lines = []
         display_option = self.display_var.get()
-        if display_option != "None":
-            for section in self.sections:
-                if section["Comment"] != "error":
-                    from_x = section["From"]
-                    to_x = section["To"]
-
-                    if display_option == "Whole plot":
-                        x_data_plot = self.data['x'][self.data['x'] >= from_x]
-                    elif display_option == "Just section":
-                        mask = (self.data['x'] >= from_x) & (self.data['x'] <= to_x)
-                        x_data_plot = self.data['x'][mask]
-
-                    fit_params = {k: float(section[k]) if section[k] else 0 for k in ["y0", "A1", "tau1", "A2", "tau2"]}
-                    fit_type = section["Type"]
-                    x0 = from_x  # Assuming x0 is from_x
-
-                    fitted_curve = self.fitter.get_fit_curve(x_data_plot, fit_type, fit_params, x0)
-                    line, = self.plot_axes.plot(x_data_plot, fitted_curve, linestyle=':')
-                    line._is_fit = True  # Mark the line as a fit
-
-        self.canvas.draw()
+        if display_option != "None" and len(self.sections):
+            x = self.data['x']
+            codes, params, x_from, x_to = self.fitter.pack_params(self.sections.data)
+            starts, stops = self.sections.slices(x)
+            # Unfitted sections (code 0) and failed fits have no curve
+            shown = np.flatnonzero((codes != 0) & (self.sections.data["Comment"] != "error"))
+            xlim = self.plot_axes.get_xlim()
+            n_bins = self.plot_axes.bbox.width
+            for i in shown:
+                # Each curve is evaluated lazily at the plotted points only, x0 is the section From
+                stop = len(x) if display_option == "Whole plot" else stops[i]
+                curve = DecimatedCurve(x[starts[i]:stop], self.fitter.curve_function(codes[i], params[i], x_from[i]))
+                curve.line, = self.plot_axes.plot(*curve.view(xlim, n_bins), linestyle=':')
+                curve.line._is_fit = True  # Mark the line as a fit
+                self.blit.add(curve.line)
+                self.fit_lines.append(curve)
+
+        self.blit.update()
 
     def clear_fits(self):
-        self.fits = []
+        self.sections.clear_fits()
+        self.fit_lines = []
         for line in self.plot_axes.lines[:]:
-            if line.get_label().startswith('Fit Section'):
-                line.remove()
-        self.canvas.draw()
+            if getattr(line, '_is_fit', False):
+                self.blit.remove(line)
+        self.blit.update()
 
     def find_knees(self):
-            # Placeholder method
-        self.update_status_info("Find Knees functionality is currently a placeholder.")
+        if self.data is None:
+            self.update_status_info("No data loaded to find knees.")
+            return
+        # Edges of concentration pulses, or slope changes of the response without pulses
+        self.knees = self.knee_finder.find(self.data)
+        self.plot_knees()
+        if len(self.knees) < 3:
+            self.update_status_info("No knees found inside the data.")
+            return
+        sections = self.sections
+        self.create_sections()
+        if self.sections is not sections:
+            self.update_status_info(f"Found {len(self.knees) - 2} knees, sections created between them.")
+        else:
+            self.update_status_info(f"Found {len(self.knees) - 2} knees.")
 
     def edit_knees(self):
         # Format the current knees for display
@@ -598,11 +829,11 @@ class App(tk.Tk):
         # Remove lines
         for line in self.plot_axes.lines[:]:
             if getattr(line, '_is_knee', False):
-                line.remove()
+                self.blit.remove(line)
 
         # Remove annotations
         for annotation in self.knee_annotations:
-            annotation.remove()
+            self.blit.remove(annotation)
         self.knee_annotations.clear()
 
         # Plot new knees
@@ -610,10 +841,11 @@ class App(tk.Tk):
         for x, y in zip(self.knees, y_knees):
             line, = self.plot_axes.plot(x, y, 'o', color='darkgoldenrod', markersize=8)
             line._is_knee = True  # Mark the line as a knee
-            annotation = self.plot_axes.annotate(f"{x:.2f}", (x, y))
+            self.blit.add(line)
+            annotation = self.blit.add(self.plot_axes.annotate(f"{x:.2f}", (x, y)))
             self.knee_annotations.append(annotation)
 
-        self.canvas.draw()
+        self.blit.update()
 
     def remove_knees(self):
         if self.cursor_A is not None and self.cursor_B is not None:
@@ -641,24 +873,9 @@ class App(tk.Tk):
                                       f"Are you sure you want to replace all currently set sections?")
             if not confirm:
                 return
-        # Clear existing sections
-        self.sections = []
-        # Create sections between knees
-        for i in range(len(self.knees) - 1):
-            section = {
-                "#": i + 1,
-                "From": self.knees[i],
-                "To": self.knees[i + 1],
-                "Type": "",
-                "y0": "",
-                "A1": "",
-                "tau1": "",
-                "A2": "",
-                "tau2": "",
-                "tau90": "",
-                "Comment": ""
-            }
-            self.sections.append(section)
+        # Replace existing sections by sections between knees
+        self.cancel_fit()
+        self.sections = SectionTable.from_ranges(list(zip(self.knees[:-1], self.knees[1:])))
         self.refresh_table()
         self.update_status_info("Sections created between knees.")
 
@@ -675,23 +892,7 @@ class App(tk.Tk):
             self.knees = sorted(set(self.knees))  # Ensure knees are unique and sorted
 
             # Add a new section between A and B
-            section_number = len(self.sections) + 1
-            section = {
-                "#": section_number,
-                "From": A,
-                "To": B,
-                "Type": "",
-                "y0": "",
-                "A1": "",
-                "tau1": "",
-                "A2": "",
-                "tau2": "",
-                "tau90": "",
-                "Comment": "",
-                "prev_y0": ""
-            }
-
-            self.sections.append(section)
+            section = self.sections.append(A, B)
             self.update_section_comment_with_median_concentration(section)
 
             # Update the plot and table
@@ -709,11 +910,16 @@ class App(tk.Tk):
             confirm = messagebox.askyesno("Confirm Deletion",
                                           f"Are you sure you want to remove section {section_number}?")
             if confirm:
-                # Remove the section from the sections list
-                del self.sections[item_index]
-                # Update section numbers
-                for idx, section in enumerate(self.sections):
-                    section["#"] = idx + 1
+                # Remove the section, following sections are renumbered
+                self.cancel_fit()
+                self.sections.remove(item_index)
+                # The following section is chained to the preceding one now
+                if item_index < len(self.sections):
+                    y_first = None
+                    if item_index == 0:
+                        _, y_data = self.fitter.section_data(self.data, self.sections[0])
+                        y_first = y_data[0] if len(y_data) else None
+                    self.fitter.propagate(self.sections, item_index, y_first)
                 self.refresh_table()
                 self.update_status_info(f"Section {section_number} removed.")
                 self.plot_data()
@@ -724,8 +930,9 @@ class App(tk.Tk):
         confirm = messagebox.askyesno("Confirm Deletion",
                                          f"Are you sure you want to remove all sections?")
         if confirm:
-            # Remove the section from the sections list
-            self.sections = []
+            # Remove all sections
+            self.cancel_fit()
+            self.sections.clear()
             self.clear_fits()
             self.plot_data()
             self.refresh_table()
@@ -738,12 +945,15 @@ class App(tk.Tk):
             if A == B:
                 self.update_status_info("Cursor A and B positions are the same.")
                 return
-            mask = (self.data['x'] >= A) & (self.data['x'] <= B)
-            if not mask.any():
+            mask = section_slice(self.data['x'], A, B)
+            if mask.stop == mask.start:
                 self.update_status_info("No data in the selected range.")
                 return
+            # Fits running in the background read the data, they are stopped and the data copied
+            self.cancel_fit()
+            self.stop_following()  # Edited data no longer correspond to the file
             x_data = self.data['x'][mask]
-            y_data = self.data['y']
+            y_data = self.data['y'].copy()
             # Find y-values at A and B by interpolation
             y_A = np.interp(A, self.data['x'], self.data['y'])
             y_B = np.interp(B, self.data['x'], self.data['y'])
@@ -753,6 +963,7 @@ class App(tk.Tk):
             y_data[mask] = y_interp
             # Update the data
             self.data['y'] = y_data
+            self.fitter.clear_cache()
             # Update the plot
             self.plot_data()
             self.update_status_info(f"Data interpolated between {A:.2f} and {B:.2f}.")
@@ -786,8 +997,8 @@ class App(tk.Tk):
             if self.cursor_A is not None and self.cursor_B is not None:
                 A = min(self.cursor_A, self.cursor_B)
                 B = max(self.cursor_A, self.cursor_B)
-                mask = (self.data['x'] >= A) & (self.data['x'] <= B)
-                if not mask.any():
+                mask = section_slice(self.data['x'], A, B)
+                if mask.stop == mask.start:
                     self.update_status_info("No data in the selected range.")
                     dialog.destroy()
                     return
@@ -816,8 +1027,13 @@ class App(tk.Tk):
                     dialog.destroy()
                     return
 
-            # Update the data
-            self.data['y'][mask] = filtered_y
+            # Update the data, a copy as fits running in the background read it
+            self.cancel_fit()
+            self.stop_following()  # Edited data no longer correspond to the file
+            y_filtered = self.data['y'].copy()
+            y_filtered[mask] = filtered_y
+            self.data['y'] = y_filtered
+            self.fitter.clear_cache()
 
             # Update the plot
             self.plot_data()
@@ -843,6 +1059,120 @@ class App(tk.Tk):
     def on_display_option_changed(self, *args):
         self.plot_fits()
 
+    def on_solver_changed(self):
+        self.fitter.solver = "varpro" if self.varpro_var.get() else "curve_fit"
+        self.update_status_info(f"Exponential fits use {self.fitter.solver} solver.")
+
+    def on_loss_changed(self, event=None):
+        # The loss is a part of the cache key, cached fits of the other loss are not reused
+        self.fitter.loss = self.loss_var.get()
+        self.update_status_info(f"Fits use {self.fitter.loss} loss.")
+
+    def show_diagnostics(self):
+        """
+        Opens the window with timings of loading, format detection, fits, t90 and drawing.
+        Recording is off until "Record timings" is checked; the timings are exported as JSON
+        and a cProfile profile of the application can be saved for pstats/snakeviz.
+        """
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        dialog = tk.Toplevel(self)
+        dialog.title("Diagnostics")
+        dialog.iconbitmap(self.dialog_icon)
+        self.diagnostics_window = dialog
+
+        controls = tk.Frame(dialog)
+        controls.pack(side=tk.TOP, fill=tk.X)
+        record_var = tk.BooleanVar(value=instruments.enabled)
+        profile_var = tk.BooleanVar(value=False)
+
+        def on_record():
+            instruments.enabled = record_var.get()
+            if instruments.enabled and self.diagnostics_poll is None:
+                self.diagnostics_poll = self.after(DIAGNOSTICS_POLL_MS, self.poll_diagnostics)
+            else:
+                self.status_label_timing.config(text="")
+
+        def on_profile():
+            if profile_var.get():
+                instruments.start_profile()
+            else:
+                instruments.stop_profile()
+
+        def reset():
+            instruments.reset()
+            self.refresh_diagnostics()
+
+        def export_json():
+            filepath = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+            if filepath:
+                try:
+                    instruments.save_json(filepath)
+                    self.update_status_info(f"Timings exported to {filepath}.")
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to export timings: {e}")
+
+        def save_profile():
+            filepath = filedialog.asksaveasfilename(defaultextension=".prof", filetypes=[("cProfile dumps", "*.prof")])
+            if filepath:
+                profile_var.set(False)
+                if instruments.save_profile(filepath):
+                    self.update_status_info(f"Profile saved to {filepath}.")
+                else:
+                    self.update_status_info("No profile recorded, check Profile first.")
+
+        tk.Checkbutton(controls, text="Record timings", variable=record_var, command=on_record).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Checkbutton(controls, text="Profile", variable=profile_var, command=on_profile).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(controls, text="Reset", command=reset).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(controls, text="Save Profile", command=save_profile).pack(side=tk.RIGHT, padx=5, pady=5)
+        tk.Button(controls, text="Export JSON", command=export_json).pack(side=tk.RIGHT, padx=5, pady=5)
+
+        columns = ("Step", "Count", "Total [ms]", "Mean [ms]", "Max [ms]", "Last [ms]")
+        self.diagnostics_tree = ttk.Treeview(dialog, columns=columns, show='headings', height=10)
+        for col in columns:
+            self.diagnostics_tree.heading(col, text=col)
+            self.diagnostics_tree.column(col, width=180 if col == "Step" else 90, anchor=tk.W if col == "Step" else tk.E)
+        self.diagnostics_tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        tk.Label(dialog, text="Latest fits:").pack(anchor='w', padx=5)
+        fit_columns = ("Type", "Points", "nfev", "Status", "Time [ms]")
+        self.diagnostics_fits = ttk.Treeview(dialog, columns=fit_columns, show='headings', height=8)
+        for col in fit_columns:
+            self.diagnostics_fits.heading(col, text=col)
+            self.diagnostics_fits.column(col, width=140 if col == "Type" else 90)
+        self.diagnostics_fits.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        self.diagnostics_counters = tk.Label(dialog, text="", anchor=tk.W, justify=tk.LEFT)
+        self.diagnostics_counters.pack(fill=tk.X, padx=5, pady=5)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        """Shows the current timings in the status bar and in the Diagnostics window (if open)."""
+        if instruments.latest is not None:
+            name, seconds = instruments.latest
+            self.status_label_timing.config(text=f"{name}: {seconds * 1e3:.1f} ms")
+        if self.diagnostics_window is None or not self.diagnostics_window.winfo_exists():
+            return
+        self.diagnostics_tree.delete(*self.diagnostics_tree.get_children())
+        for name, count, total, mean, maximum, last in instruments.summary():
+            self.diagnostics_tree.insert("", "end", values=(name, count, f"{total * 1e3:.1f}", f"{mean * 1e3:.2f}",
+                                                            f"{maximum * 1e3:.2f}", f"{last * 1e3:.2f}"))
+        self.diagnostics_fits.delete(*self.diagnostics_fits.get_children())
+        fits = [event for event in instruments.events if event["name"] == "fit"][-50:]
+        for event in reversed(fits):
+            self.diagnostics_fits.insert("", "end", values=(event.get("type"), event.get("n"), event.get("nfev"),
+                                                            event.get("status"), f"{event['time'] * 1e3:.2f}"))
+        counters = ", ".join(f"{name}: {value}" for name, value in sorted(instruments.counters.items()))
+        self.diagnostics_counters.config(text=counters)
+
+    def poll_diagnostics(self):
+        self.diagnostics_poll = None
+        if not instruments.enabled:
+            return
+        self.refresh_diagnostics()
+        self.diagnostics_poll = self.after(DIAGNOSTICS_POLL_MS, self.poll_diagnostics)
+
     def edit_section_on_double_click(self, event):
         item_id = self.tree.identify_row(event.y)
         if not item_id:
@@ -888,6 +1218,9 @@ class App(tk.Tk):
                                      parent=dialog)
                 return
 
+            # Running fits would store results for the old range
+            self.cancel_fit()
+
             # Update the section
             section['From'] = from_value
             section['To'] = to_value
@@ -895,7 +1228,7 @@ class App(tk.Tk):
             # Recalculate knees based on updated sections
             self.knees = []
             for sec in self.sections:
-                self.knees.extend([sec['From'], sec['To']])
+                self.knees.extend([float(sec['From']), float(sec['To'])])
             self.knees = sorted(set(self.knees))
 
             # Update the plot and table
@@ -928,7 +1261,7 @@ class App(tk.Tk):
     def on_section_selected(self, event):
         # Remove existing highlight rectangle if it exists
         if hasattr(self, 'highlight_rectangle') and self.highlight_rectangle is not None:
-            self.highlight_rectangle.remove()
+            self.blit.remove(self.highlight_rectangle)
             self.highlight_rectangle = None
 
         selected_item = self.tree.selection()
@@ -940,12 +1273,12 @@ class App(tk.Tk):
             to_x = section["To"]
 
             # Add rectangle to highlight the selected section
-            self.highlight_rectangle = self.plot_axes.axvspan(
+            self.highlight_rectangle = self.blit.add(self.plot_axes.axvspan(
                 from_x, to_x, color='yellow', alpha=0.3, zorder=0
-            )
+            ))
 
-        # Redraw the canvas to show updates
-        self.canvas.draw()
+        # Redraw only the overlays to show updates
+        self.blit.update()
 
     def update_section_comment_with_median_concentration(self, section):
         """
@@ -956,8 +1289,8 @@ class App(tk.Tk):
         to_x = section['To']
         # Ensure 'c' data exists
         if 'c' in self.data:
-            mask = (self.data['x'] >= from_x) & (self.data['x'] <= to_x)
-            if mask.any():
+            mask = section_slice(self.data['x'], from_x, to_x)
+            if mask.stop > mask.start:
                 c_data = self.data['c'][mask]
                 # Calculate median concentration
                 concentration_median = np.median(c_data)
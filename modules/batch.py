@@ -0,0 +1,199 @@
+# batch.py
+
+import glob
+import os
+
+import pandas as pd
+
+from modules.data_loader import DataLoader
+from modules.executor import FitExecutor
+from modules.fitter import Fitter
+from modules.knees import KneeFinder
+from modules.sections import SectionTable
+
+# Short names accepted on the command line
+FIT_TYPES = {
+    "single": "Single Exp. Decay",
+    "double": "Double Exp. Decay",
+    "aux": "Aux",
+}
+
+
+class BatchFitter:
+    """
+    Headless fitting engine. Applies the same knee/section recipe to every data file,
+    fits all sections with Fitter and collects the results into one table.
+
+    The recipe is either a list of knees (sections are created between them, the same
+    way as "Create Sections" does in the GUI), knees="auto" to find the knees of every file
+    by KneeFinder ("Find Knees"), or a saved project (.dat) whose From/To ranges are reused.
+    Without any recipe the whole file is fitted as a single section.
+
+    Sections of all files are fitted in parallel by FitExecutor with max_workers processes
+    (all cores by default). With use_cache=False the files are parsed without reading or writing
+    the parsed-data cache of DataLoader.
+    """
+
+    def __init__(self, fit_type="Single Exp. Decay", knees=None, project=None, max_workers=None,
+                 solver="curve_fit", loss="linear", max_nfev=10000, time_budget=None, use_cache=True):
+        self.fit_type = FIT_TYPES.get(fit_type, fit_type)
+        self.auto_knees = knees == "auto"
+        self.knees = sorted(knees) if knees and not self.auto_knees else []
+        self.ranges = self.load_ranges(project) if project else []
+        self.loader = DataLoader(use_cache=use_cache)
+        self.fitter = Fitter(solver=solver, loss=loss, max_nfev=max_nfev, time_budget=time_budget)
+        self.knee_finder = KneeFinder()
+        self.max_workers = max_workers
+
+    def load_ranges(self, filepath):
+        """
+        Reads the From/To ranges of sections from a project saved by Fitter.save_project.
+        """
+        df = pd.read_csv(filepath)
+        return list(zip(df["From"].astype(float), df["To"].astype(float)))
+
+    def create_sections(self, data):
+        """
+        Creates the SectionTable for the loaded data according to the recipe.
+        """
+        x_min = data['x'].min()
+        x_max = data['x'].max()
+        knees = self.knee_finder.find(data) if self.auto_knees else self.knees
+        if self.ranges:
+            ranges = self.ranges
+        elif len(knees) >= 2:
+            ranges = list(zip(knees[:-1], knees[1:]))
+        else:
+            ranges = [(x_min, x_max)]
+
+        # Ranges lying completely outside of the data are skipped
+        ranges = [(from_x, to_x) for from_x, to_x in ranges if not (to_x < x_min or from_x > x_max)]
+        return SectionTable.from_ranges(ranges)
+
+    def process_file(self, filepath):
+        """
+        Loads one data file, creates its sections and fits them. The prev_y0 hand-off
+        for t90 is chained from left to right as in "Fit All Sections".
+
+        Returns:
+            SectionTable: Fitted sections, None if the file could not be loaded.
+        """
+        data = self.loader.load_xyc(filepath)
+        if data is None:
+            return None
+        sections = self.create_sections(data)
+        with FitExecutor(self.fitter, self.max_workers) as executor:
+            executor.fit_sections(data, sections, self.fit_type)
+        return sections
+
+    def find_files(self, directory, patterns=("*.txt", "*.csv")):
+        """
+        Returns sorted list of data files in the directory matching any of the patterns.
+        """
+        files = set()
+        for pattern in patterns:
+            files.update(glob.glob(os.path.join(directory, pattern)))
+        return sorted(files)
+
+    def run(self, filepaths, output):
+        """
+        Fits all files and writes one table with a row per section to the output file
+        (CSV or Excel, same as "Export Fits").
+
+        Returns:
+            DataFrame: All fitted sections, with the source 'File' as the first column.
+        """
+        # Files are parsed in parallel, members of ZIP archives are named "archive.zip/member"
+        datasets = self.loader.load_many(filepaths, self.max_workers)
+        jobs = [(data, self.create_sections(data), self.fit_type) for _, data in datasets]
+        names = datasets.names
+
+        with FitExecutor(self.fitter, self.max_workers) as executor:
+            executor.fit_files(jobs)
+
+        frames = []
+        for name, (_, sections, _) in zip(names, jobs):
+            df = sections.to_frame()
+            df.insert(0, "File", name)
+            # t90 is in "tau90" already, the other response times are solved for all sections at once
+            times = self.fitter.response_times(sections.data)
+            for level in ("t10", "t50", "t63"):
+                df.insert(df.columns.get_loc("tau90"), level, times[level])
+            frames.append(df)
+        fits = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if len(fits):
+            self.fitter.export_fits(output, fits)
+        return fits
+
+    def compare_jacobian(self, filepaths):
+        """
+        Fits every section of the files with analytic and with finite-difference Jacobians
+        and prints wall time, function and Jacobian evaluations of both, per file and in total.
+
+        Returns:
+            list: Rows (dicts) with the comparison of each section.
+        """
+        rows = []
+        for name, data in self.loader.load_many(filepaths, self.max_workers):
+            for section in self.create_sections(data):
+                x_data, y_data = self.fitter.section_data(data, section)
+                if len(x_data) < 2:
+                    continue
+                result = self.fitter.compare_jacobian(self.fit_type, x_data, y_data, x_data.min())
+                rows.append({
+                    "File": name,
+                    "#": section["#"],
+                    "time_analytic": result["analytic"]["time"],
+                    "time_numeric": result["numeric"]["time"],
+                    "nfev_analytic": result["analytic"]["nfev"],
+                    "nfev_numeric": result["numeric"]["nfev"],
+                    "njev_analytic": result["analytic"]["njev"],
+                    "failed_analytic": result["analytic"]["params"] is None,
+                    "failed_numeric": result["numeric"]["params"] is None,
+                })
+
+        if rows:
+            df = pd.DataFrame(rows)
+            summary = df.drop(columns="#").groupby("File").sum()
+            summary.loc["Total"] = summary.sum()
+            print(f"{self.fit_type}: analytic vs. finite-difference Jacobian")
+            print(summary.to_string(float_format="{:.4f}".format))
+        return rows
+
+
+def parse_knees(knees_str):
+    """
+    Parses knees given as a semicolon delimited list (the same format as "Edit Knees"),
+    or "auto" for automatic detection.
+    """
+    if knees_str.strip().lower() == "auto":
+        return "auto"
+    return sorted(float(knee) for knee in knees_str.split(';') if knee.strip())
+
+
+def run_batch(args):
+    """
+    Entry point of `main.py --batch`. Returns the process exit code.
+    """
+    knees = parse_knees(args.knees) if args.knees else None
+    batch = BatchFitter(fit_type=args.fit_type, knees=knees, project=args.project,
+                        max_workers=args.workers, solver=args.solver, loss=args.loss,
+                        max_nfev=args.max_nfev, time_budget=args.time_budget, use_cache=not args.no_cache)
+
+    if os.path.isdir(args.batch):
+        filepaths = batch.find_files(args.batch, args.pattern)
+    else:
+        filepaths = [args.batch]
+    if not filepaths:
+        print(f"No data files found in {args.batch}")
+        return 1
+
+    if args.compare_jac:
+        return 0 if batch.compare_jacobian(filepaths) else 1
+
+    fits = batch.run(filepaths, args.output)
+    if not len(fits):
+        print("No sections were fitted.")
+        return 1
+    print(f"{len(fits)} sections from {len(filepaths)} files written to {args.output}")
+    return 0
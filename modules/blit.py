@@ -0,0 +1,72 @@
+# blit.py
+
+from contextlib import contextmanager
+
+
+class BlitManager:
+    """
+    Incremental redraw of overlay artists (cursors, highlight, knees, fits).
+
+    Overlays are animated, so a full canvas.draw() renders only the static figure (data traces,
+    axes, labels). Its image is cached as the background on every draw_event, and update()
+    restores the background and draws just the overlays on top of it, without re-rendering
+    the data traces. Zoom, pan and resize still do a full draw, which refreshes the background.
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.background = None
+        self.artists = []
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    def add(self, artist):
+        """
+        Registers the artist as an overlay and returns it.
+        """
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def remove(self, artist):
+        """
+        Removes the overlay from its axes.
+        """
+        if artist in self.artists:
+            self.artists.remove(artist)
+        if artist.figure is not None:
+            artist.remove()
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        # Artists removed from the axes (e.g. by axes.clear()) are dropped
+        self.artists = [artist for artist in self.artists if artist.figure is not None]
+        for artist in sorted(self.artists, key=lambda artist: artist.get_zorder()):
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """
+        Redraws the overlays over the cached background.
+        """
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+    @contextmanager
+    def static(self):
+        """
+        Temporarily renders the overlays as ordinary artists, e.g. for savefig which skips animated ones.
+        """
+        for artist in self.artists:
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in self.artists:
+                artist.set_animated(True)
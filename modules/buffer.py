@@ -0,0 +1,61 @@
+# buffer.py
+
+import numpy as np
+
+
+class ColumnBuffer:
+    """
+    Float64 columns of equal length kept in preallocated arrays.
+
+    Blocks of rows are appended without reallocating as long as they fit into the capacity,
+    the arrays grow by doubling otherwise. column(name) returns a writable view of the used part;
+    views taken before a growth keep pointing to the old arrays.
+    """
+
+    def __init__(self, names=("x", "y", "c"), capacity=1024):
+        self.names = tuple(names)
+        self._arrays = {name: np.empty(max(int(capacity), 1), dtype=np.float64) for name in self.names}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    @property
+    def capacity(self):
+        return len(self._arrays[self.names[0]])
+
+    def column(self, name):
+        return self._arrays[name][:self._size]
+
+    def reserve(self, capacity):
+        """
+        Ensures room for capacity rows in total.
+        """
+        if capacity <= self.capacity:
+            return
+        for name in self.names:
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self._size] = self._arrays[name][:self._size]
+            self._arrays[name] = grown
+
+    def append(self, block):
+        """
+        Appends a block of rows given as a dict of equally long arrays, one per column.
+        """
+        length = len(block[self.names[0]])
+        if self._size + length > self.capacity:
+            self.reserve(max(2 * self.capacity, self._size + length))
+        for name in self.names:
+            self._arrays[name][self._size:self._size + length] = block[name]
+        self._size += length
+
+    def trim(self, max_slack=0.1):
+        """
+        Releases the unused capacity when it is more than max_slack of the used size.
+        """
+        if self.capacity - self._size > max_slack * self._size:
+            for name in self.names:
+                self._arrays[name] = self._arrays[name][:self._size].copy()
@@ -1,71 +1,359 @@
 # data_loader.py
 
+import numpy as np
 import pandas as pd
+import codecs
 import csv
+import fnmatch
+import hashlib
+import io
+import json
+import os
 import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import chardet
 
+from modules.buffer import ColumnBuffer
+from modules.datasets import DatasetCollection
+from modules.instruments import instruments
+
+# Parsed data of loaded files, one file per data file, kept out of the users' data directories
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".responsefitter_cache")
+CACHE_VERSION = 3  # Increase when the cached content changes, older caches are re-parsed
+CACHE_MAX_BYTES = 2 << 30  # The least recently used caches are removed beyond this total size
+STREAM_CHUNKSIZE = 200000  # Rows parsed at once by the streaming loader
+TAIL_BLOCK_BYTES = 1 << 24  # Bytes of a growing file parsed at once by TailReader
+
+DELIMITERS = ['\t', ';', ',', '|']
+
+# Dialects (encoding, delimiter) of known instruments by their header fingerprint, see header_fingerprint
+KNOWN_FORMATS = {
+    # Gas rig exporting Time/R/Concentration only
+    "\t:time|r|concentration": ("utf-8", "\t"),
+    # Source-meter station, units in cp1250 (°C)
+    "\t:time|u2|u3|i set|u2-u3|r|ts|t|t2|compliance|flow|concentration": ("cp1250", "\t"),
+}
+
+# Possible base names of the required columns
+BASE_NAMES = {
+    'time': ['time'],
+    'r': ['r', 'resistance'],
+    'concentration': ['concentration', 'conc', 'c'],
+    'weight': ['weight', 'weights', 'w']  # Optional weights of the points in fits
+}
+
+def base_name(column_name):
+    """
+    Removes any text within brackets or parentheses from the column name (units, start time).
+    """
+    return re.sub(r'\s*[\(\[\{][^\)\]\}]*[\)\]\}]\s*', '', column_name).strip()
+
+
+def header_fingerprint(raw_data):
+    """
+    Returns the fingerprint of the instrument which wrote the file: the delimiter and
+    the lower case base names of the columns in its header line, e.g. "\\t:time|r|concentration".
+    It does not depend on the encoding, as non-ASCII characters appear only within units.
+    None if the first line has no delimiter.
+    """
+    line = raw_data.split(b'\n', 1)[0].rstrip(b'\r').decode('latin-1')
+    delimiter = max(DELIMITERS, key=line.count)
+    if delimiter not in line:
+        return None
+    return delimiter + ":" + "|".join(base_name(field).lower() for field in line.split(delimiter))
+
+
+class FormatRegistry:
+    """
+    Remembers the dialect (encoding, delimiter) of every instrument by the fingerprint of its header,
+    so files from known instruments are loaded without chardet and csv.Sniffer.
+    Seeded by KNOWN_FORMATS; with a path, dialects detected later are kept in a JSON file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.formats = dict(KNOWN_FORMATS)
+        self._lock = threading.Lock()  # Files of a ZIP archive are loaded by several threads
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.formats.update({key: tuple(value) for key, value in json.load(f).items()})
+            except Exception as e:
+                print(f"Error reading formats {path}: {e}")
+
+    def lookup(self, fingerprint):
+        return self.formats.get(fingerprint)
+
+    def remember(self, fingerprint, encoding, delimiter, replace=False):
+        """
+        Stores the dialect of a new instrument. A known dialect is replaced only with replace=True,
+        when its encoding failed for a file, so files of an instrument which decode with more
+        encodings (e.g. plain ASCII ones) neither flip the entry nor rewrite the file on every load.
+        """
+        if fingerprint is None:
+            return
+        with self._lock:
+            known = self.formats.get(fingerprint)
+            if known == (encoding, delimiter) or (known is not None and not replace):
+                return
+            self.formats[fingerprint] = (encoding, delimiter)
+            if self.path:
+                try:
+                    with open(self.path, 'w', encoding='utf-8') as f:
+                        json.dump(self.formats, f, indent=1)
+                except Exception as e:
+                    print(f"Error writing formats {self.path}: {e}")
+
+
+DEFAULT_FORMATS = FormatRegistry()  # Shared by loaders without their own registry
+
+
+def load_worker(filepath, use_cache, cache_dir, streaming, formats):
+    """
+    Loads one file in a worker process of DataLoader.load_many. Must stay a module level
+    function to be picklable. Returns the data and the dialects which differ from formats
+    after loading (new instruments, or known ones whose encoding failed).
+    """
+    registry = FormatRegistry()
+    registry.formats.update(formats)
+    data = DataLoader(use_cache=use_cache, cache_dir=cache_dir, streaming=streaming,
+                      formats=registry).load_xyc(filepath)
+    return data, {key: value for key, value in registry.formats.items() if formats.get(key) != value}
+
+
 class DataLoader:
+    """
+    Loads delimited data files. Parsed data are stored in a binary cache in cache_dir
+    (one .npz per data file, named by the hash of its path) keyed on the path, modification time
+    and size of the file, so reopening an unchanged file skips the encoding/delimiter detection
+    and parsing. Nothing is written next to the data files.
+
+    By default the files are streamed: only the Time, R and Concentration columns are parsed,
+    in blocks of STREAM_CHUNKSIZE rows, straight into float64 buffers (see iter_blocks).
+    With streaming=False the whole file is read into a DataFrame first.
+    """
+
+    def __init__(self, use_cache=True, streaming=True, formats=None, cache_dir=CACHE_DIR):
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.streaming = streaming
+        self.formats = formats if formats is not None else DEFAULT_FORMATS
+
     def detect_encoding(self, filepath):
         """
         Detects the encoding of the file using chardet.
         If detection fails, defaults to 'utf-8'.
         """
         try:
-            with open(filepath, 'rb') as f:
-                raw_data = f.read(10000)  # Read first 10,000 bytes
-                result = chardet.detect(raw_data)
-                encoding = result['encoding']
-                # Uncomment for debugging: print(f"Detected encoding: {encoding}")
-                if encoding:
-                    return encoding
-                else:
-                    print("Encoding detection failed, defaulting to 'utf-8'.")
-                    return 'utf-8'
+            return self.detect_encoding_bytes(self.read_sample(filepath, 10000))  # Read first 10,000 bytes
         except Exception as e:
             print(f"Error detecting encoding: {e}")
             return 'utf-8'
 
+    def detect_encoding_bytes(self, raw_data):
+        """
+        Detects the encoding of a sample of raw data using chardet, 'utf-8' if detection fails.
+        """
+        with instruments.timer("detect encoding (chardet)"):
+            result = chardet.detect(raw_data)
+        encoding = result['encoding']
+        # Uncomment for debugging: print(f"Detected encoding: {encoding}")
+        if encoding:
+            return encoding
+        else:
+            print("Encoding detection failed, defaulting to 'utf-8'.")
+            return 'utf-8'
+
     def detect_delimiter(self, filepath, encoding):
         """
         Automatically detects the delimiter in the given file using csv.Sniffer.
         If detection fails, defaults to tab or comma based on common patterns.
         """
+        with open(filepath, 'r', newline='', encoding=encoding) as csvfile:
+            sample = csvfile.read(1024)
+        return self.detect_delimiter_text(sample)
+
+    def detect_delimiter_bytes(self, raw_data, encoding):
+        """
+        Detects the delimiter in the beginning of raw data decoded with the encoding.
+        """
+        # Incremental decoder tolerates a multi-byte character cut at the end of the sample
+        sample = codecs.getincrementaldecoder(encoding)().decode(raw_data[:4096])
+        return self.detect_delimiter_text(sample[:1024])
+
+    def detect_delimiter_text(self, sample):
+        """
+        Detects the delimiter in a text sample using csv.Sniffer.
+        If detection fails, defaults to tab or comma based on the first line.
+        """
         try:
-            with open(filepath, 'r', newline='', encoding=encoding) as csvfile:
-                sample = csvfile.read(1024)
-                sniffer = csv.Sniffer()
+            sniffer = csv.Sniffer()
+            with instruments.timer("detect delimiter"):
                 dialect = sniffer.sniff(sample, delimiters=[',', ';', '\t', '|'])
-                delimiter = dialect.delimiter
-                # Uncomment for debugging: print(f"Detected delimiter: '{delimiter}'")
-                return delimiter
+            delimiter = dialect.delimiter
+            # Uncomment for debugging: print(f"Detected delimiter: '{delimiter}'")
+            return delimiter
         except Exception as e:
             # If delimiter detection fails, check for tabs or commas manually
-            with open(filepath, 'r', encoding=encoding) as f:
-                first_line = f.readline()
-                if '\t' in first_line:
-                    delimiter = '\t'
-                elif ',' in first_line:
-                    delimiter = ','
-                else:
-                    delimiter = ','  # Default to comma
+            first_line = sample.splitlines()[0] if sample else ''
+            if '\t' in first_line:
+                delimiter = '\t'
+            elif ',' in first_line:
+                delimiter = ','
+            else:
+                delimiter = ','  # Default to comma
             print(f"Could not detect delimiter using csv.Sniffer, defaulting to '{delimiter}'. Error: {e}")
             return delimiter
 
+    def detect_format(self, raw_data):
+        """
+        Detects encoding and delimiter from a sample of raw data, fast paths first:
+        the dialect of a known instrument (by header fingerprint), then a strict UTF-8 (ASCII)
+        check with csv.Sniffer, chardet only for other data.
+
+        Returns:
+            tuple: (encoding, delimiter)
+        """
+        known = self.formats.lookup(header_fingerprint(raw_data))
+        if known:
+            instruments.count("format from registry")
+            return known
+        instruments.count("format detected")
+        try:
+            # Incremental decoder tolerates a multi-byte character cut at the end of the sample
+            codecs.getincrementaldecoder('utf-8')().decode(raw_data)
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = self.detect_encoding_bytes(raw_data)
+        return encoding, self.detect_delimiter_bytes(raw_data, encoding)
+
+    def read_sample(self, source, size):
+        """
+        Returns the first size bytes of the source, a file path or the raw content of a file.
+        """
+        if isinstance(source, bytes):
+            return source[:size]
+        with open(source, 'rb') as f:
+            return f.read(size)
+
+    def open_source(self, source):
+        """
+        Returns the source (file path or raw content) in a form accepted by pd.read_csv.
+        """
+        return io.BytesIO(source) if isinstance(source, bytes) else source
+
     def extract_base_name(self, column_name):
         """
         Extracts the base name from a column by removing any text within brackets or parentheses.
         Handles multiple brackets/parentheses and nested cases.
         """
         # Remove any content within parentheses, brackets, or braces
-        base_name = re.sub(r'\s*[\(\[\{][^\)\]\}]*[\)\]\}]\s*', '', column_name)
-        return base_name.strip()
+        return base_name(column_name)
+
+    def sort_by_time(self, x, *columns):
+        """
+        Sections are found by binary search, which requires monotonic time.
+        Rows of unsorted data are reordered by time (stable, equal times keep their order).
+        Returns x and the other columns (y, c and optional weights) in the same order.
+        """
+        if len(x) > 1 and np.any(x[1:] < x[:-1]):
+            print("Time column is not monotonic, sorting the data by time.")
+            order = np.argsort(x, kind='stable')
+            return (x[order],) + tuple(column[order] for column in columns)
+        return (x,) + columns
+
+    def cache_path(self, filepath):
+        # Named by the path only, a modified file replaces its outdated cache
+        name = hashlib.blake2b(os.path.abspath(filepath).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, name + ".npz")
+
+    def file_key(self, filepath):
+        """
+        Returns (absolute path, modification time in ns, size) identifying the file version.
+        """
+        stat = os.stat(filepath)
+        return os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+
+    def load_cache(self, filepath):
+        """
+        Returns data from the cache, or None if there is no valid cache for the current file.
+        """
+        cache_path = self.cache_path(filepath)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache:
+                if int(cache['version']) != CACHE_VERSION:
+                    return None
+                key = (str(cache['path']), int(cache['mtime_ns']), int(cache['size']))
+                if key != self.file_key(filepath):
+                    return None
+                # Modification time of the cache marks its last use, see prune_cache
+                os.utime(cache_path)
+                data = {
+                    'x': cache['x'],
+                    'y': cache['y'],
+                    'c': cache['c'],
+                    'xlabel': str(cache['xlabel']),
+                    'ylabel': str(cache['ylabel']),
+                    'zlabel': str(cache['zlabel'])
+                }
+                if 'w' in cache.files:
+                    data['w'] = cache['w']
+                return data
+        except Exception as e:
+            print(f"Error reading cache {cache_path}: {e}")
+            return None
+
+    def save_cache(self, filepath, data):
+        """
+        Stores the parsed data into the cache. Only numeric columns are cached.
+        """
+        columns = [key for key in ('x', 'y', 'c', 'w') if key in data]
+        if any(np.asarray(data[key]).dtype.kind not in 'biuf' for key in columns):
+            return
+        cache_path = self.cache_path(filepath)
+        path, mtime_ns, size = self.file_key(filepath)
+        tmp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Written uncompressed (loading is a plain read) and renamed, so a cache is never half written
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, version=CACHE_VERSION, path=path, mtime_ns=mtime_ns, size=size,
+                         xlabel=data['xlabel'], ylabel=data['ylabel'], zlabel=data['zlabel'],
+                         **{key: data[key] for key in columns})
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"Error writing cache {cache_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.prune_cache()
+
+    def prune_cache(self, max_bytes=CACHE_MAX_BYTES):
+        """
+        Removes the least recently used caches until their total size is at most max_bytes.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.is_file() and entry.name.endswith(".npz")]
+            stats = sorted(((entry.stat(), entry.path) for entry in entries), key=lambda item: item[0].st_mtime_ns)
+            total = sum(stat.st_size for stat, _ in stats)
+            for stat, path in stats:
+                if total <= max_bytes:
+                    break
+                os.remove(path)
+                total -= stat.st_size
+        except OSError as e:
+            print(f"Error pruning cache {self.cache_dir}: {e}")
 
     def load_xyc(self, filepath):
         """
         Loads data from a delimited file, detects the encoding and delimiter, and extracts
         the Time, R, and Concentration columns. If the Concentration column is missing,
-        it sets it to zero.
+        it sets it to zero. An unchanged file is loaded from the cache.
 
         Parameters:
             filepath (str): Path to the delimited file.
@@ -75,10 +363,278 @@ class DataLoader:
                 - 'x': Time data
                 - 'y': R data
                 - 'c': Concentration data (zeros if not present)
+                - 'w': Weights of the points, only if the file has a Weight column
                 - 'xlabel': Original Time column name with units
                 - 'ylabel': Original R column name with units
                 - 'zlabel': Original Concentration column name with units or 'Concentration [unit]'
         """
+        name = os.path.basename(filepath)
+        if self.use_cache:
+            with instruments.timer("cache lookup", file=name):
+                data = self.load_cache(filepath)
+            if data is not None:
+                return data
+        with instruments.timer("load", file=name):
+            data = self.parse_xyc(filepath)
+        if data is None:
+            instruments.count("load failed")
+        elif self.use_cache:
+            self.save_cache(filepath, data)
+        return data
+
+    def parse_xyc(self, filepath):
+        """
+        Parses the delimited file, see load_xyc.
+        """
+        if self.streaming:
+            return self.parse_stream(filepath)
+        return self.parse_frame(filepath)
+
+    def map_columns(self, columns):
+        """
+        Maps 'time', 'r', 'concentration' and 'weight' to the actual column names.
+        Raises ValueError if Time or R is missing.
+        """
+        column_mapping = {}
+        for col in columns:
+            base_name = self.extract_base_name(col).lower()
+            for key, aliases in BASE_NAMES.items():
+                if base_name == key or base_name in aliases:
+                    column_mapping[key] = col  # Map the key to the actual column name
+                    break
+
+        # Check for required columns 'time' and 'r'
+        required = ['time', 'r']
+        missing = [col for col in required if col not in column_mapping]
+        if missing:
+            raise ValueError(f"Required columns {missing} not found in the data.")
+        return column_mapping
+
+    def estimate_rows(self, source, sample_size=65536):
+        """
+        Estimates the number of rows from the file size and the line length at its beginning.
+        """
+        sample = self.read_sample(source, sample_size)
+        size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        lines = max(sample.count(b'\n'), 1)
+        return int(size * lines / max(len(sample), 1) * 1.05) + 1
+
+    def iter_blocks(self, source, encoding, delimiter, column_mapping, chunksize=STREAM_CHUNKSIZE):
+        """
+        Reads only the Time, R, Concentration (and Weight) columns in blocks of chunksize rows,
+        so the data can be processed before the whole file is read.
+        The source is a file path or the raw content of a file.
+
+        Yields:
+            dict: float64 arrays 'x', 'y', 'c' (and 'w' with a Weight column) of one block in file order,
+                  zero 'c' if there is no Concentration column. Rows without Time or R (e.g. empty lines)
+                  are dropped.
+        """
+        usecols = [column_mapping[key] for key in ('time', 'r', 'concentration', 'weight') if key in column_mapping]
+        options = dict(delimiter=delimiter, encoding=encoding, usecols=usecols, chunksize=chunksize)
+        rows_read = 0
+        try:
+            with pd.read_csv(self.open_source(source), dtype={col: np.float64 for col in usecols}, **options) as reader:
+                for chunk in reader:
+                    rows_read += len(chunk)
+                    yield self.chunk_block(chunk, column_mapping)
+        except UnicodeDecodeError:
+            raise  # A ValueError too, but the caller retries with another encoding
+        except ValueError:
+            # Non-numeric cells (e.g. '#NAME?' exported by Excel): the file is read again as text
+            # and converted, invalid values become NaN. The rows already yielded are dropped
+            # by count of parsed rows, not of lines, as blank lines are not parsed into rows.
+            skip = rows_read
+            with pd.read_csv(self.open_source(source), dtype=str, **options) as reader:
+                for chunk in reader:
+                    if skip >= len(chunk):
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk.iloc[skip:], 0
+                    yield self.chunk_block(chunk.apply(pd.to_numeric, errors='coerce'), column_mapping)
+
+    def chunk_block(self, chunk, column_mapping):
+        x = chunk[column_mapping['time']].to_numpy(dtype=np.float64)
+        y = chunk[column_mapping['r']].to_numpy(dtype=np.float64)
+        if 'concentration' in column_mapping:
+            c = chunk[column_mapping['concentration']].to_numpy(dtype=np.float64)
+        else:
+            c = np.zeros(len(x))
+        block = {'x': x, 'y': y, 'c': c}
+        if 'weight' in column_mapping:
+            block['w'] = chunk[column_mapping['weight']].to_numpy(dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        if valid.all():
+            return block
+        return {key: values[valid] for key, values in block.items()}
+
+    def stream_xyc(self, source, encoding, delimiter):
+        """
+        Reads the blocks of the file (path or raw content) into preallocated buffers, see load_xyc.
+        """
+        header = pd.read_csv(self.open_source(source), delimiter=delimiter, encoding=encoding, nrows=0)
+        column_mapping = self.map_columns(header.columns)
+
+        buffer = ColumnBuffer(names=self.buffer_names(column_mapping), capacity=self.estimate_rows(source))
+        for block in self.iter_blocks(source, encoding, delimiter, column_mapping):
+            buffer.append(block)
+        buffer.trim()
+
+        x, y, c, *w = self.sort_by_time(*(buffer[name] for name in buffer.names))
+        data = {
+            'x': x,
+            'y': y,
+            'c': c,
+            'xlabel': column_mapping['time'],
+            'ylabel': column_mapping['r'],
+            'zlabel': column_mapping.get('concentration', 'Concentration [null]')
+        }
+        if w:
+            data['w'] = w[0]
+        return data
+
+    def buffer_names(self, column_mapping):
+        """
+        Names of the parsed columns: 'x', 'y', 'c', and 'w' if the file has a Weight column.
+        """
+        return ("x", "y", "c", "w") if 'weight' in column_mapping else ("x", "y", "c")
+
+    def parse_stream(self, source):
+        """
+        Streams the file (path or raw content) with the detected encoding,
+        or common encodings if it fails to decode.
+        """
+        try:
+            sample = self.read_sample(source, 10000)
+            with instruments.timer("detect format"):
+                encoding, delimiter = self.detect_format(sample)
+        except Exception as e:
+            print(f"Error detecting the format: {e}")
+            return None
+        for enc in [encoding, 'cp1250', 'latin1', 'utf-8']:
+            try:
+                if enc != encoding:
+                    delimiter = self.detect_delimiter_bytes(sample, enc)
+                data = self.stream_xyc(source, enc, delimiter)
+                # The dialect which worked is used directly for the next file of the instrument,
+                # a known dialect is replaced only if its encoding failed for this file
+                self.formats.remember(header_fingerprint(sample), enc, delimiter, replace=enc != encoding)
+                return data
+            except UnicodeDecodeError as e:
+                print(f"UnicodeDecodeError with encoding {enc}: {e}")
+            except Exception as e:
+                print(f"Error loading data: {e}")
+                return None
+        print("Failed to read the file with common encodings.")
+        return None
+
+    def load_many(self, filepaths, max_workers=None):
+        """
+        Loads many files (and data members of ZIP archives) at once. Cached files are loaded
+        directly, the others are parsed in parallel in max_workers processes (all cores by default).
+
+        Parameters:
+            filepaths (list): Paths of data files or ZIP archives.
+            max_workers (int): Number of processes, 1 loads the files one by one.
+
+        Returns:
+            DatasetCollection: Data sets in the order of filepaths.
+        """
+        archives = {filepath for filepath in filepaths
+                    if filepath.lower().endswith(".zip") and zipfile.is_zipfile(filepath)}
+        results = {}
+        to_parse = []
+        for filepath in filepaths:
+            if filepath in archives:
+                continue
+            data = self.load_cache(filepath) if self.use_cache else None
+            if data is not None:
+                results[filepath] = data
+            else:
+                to_parse.append(filepath)
+
+        max_workers = min(max_workers or os.cpu_count() or 1, len(to_parse))
+        if max_workers > 1:
+            known = dict(self.formats.formats)
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = {filepath: pool.submit(load_worker, filepath, self.use_cache, self.cache_dir,
+                                                 self.streaming, known)
+                           for filepath in to_parse}
+                for filepath, future in futures.items():
+                    try:
+                        results[filepath], formats = future.result()
+                    except Exception as e:
+                        print(f"Error loading data: {e}")
+                        results[filepath], formats = None, {}
+                    # Dialects detected by the workers are remembered here, a worker changed
+                    # a known one only if it failed
+                    for fingerprint, (encoding, delimiter) in formats.items():
+                        self.formats.remember(fingerprint, encoding, delimiter, replace=fingerprint in known)
+        else:
+            for filepath in to_parse:
+                results[filepath] = self.load_xyc(filepath)
+
+        collection = DatasetCollection()
+        for filepath in filepaths:
+            name = os.path.basename(filepath)
+            if filepath in archives:
+                datasets = self.load_zip(filepath)
+                if not datasets:
+                    print(f"No data loaded from: {filepath}")
+                    collection.failed.append(filepath)
+                for member, data in datasets.items():
+                    collection.add(f"{name}/{member}", f"{filepath}/{member}", data)
+            elif results[filepath] is None:
+                print(f"Failed to load: {filepath}")
+                collection.failed.append(filepath)
+            else:
+                collection.add(name, filepath, results[filepath])
+        return collection
+
+    def load_zip(self, zippath, patterns=("*.txt", "*.csv"), max_workers=None):
+        """
+        Loads data members of a ZIP archive without extracting them to disk. Members are read
+        and parsed concurrently, each with its own encoding and delimiter detection.
+
+        Parameters:
+            zippath (str): Path to the ZIP archive.
+            patterns (tuple): File name patterns of the data members.
+            max_workers (int): Number of parsing threads (default of ThreadPoolExecutor).
+
+        Returns:
+            dict: Member name to data (as returned by load_xyc), in the order of the archive.
+                  Members which failed to load are left out.
+        """
+        with zipfile.ZipFile(zippath) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()
+                     and any(fnmatch.fnmatch(os.path.basename(info.filename), pattern) for pattern in patterns)]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(lambda name: self.load_zip_member(zippath, name), names)
+            datasets = {name: data for name, data in zip(names, results) if data is not None}
+        return datasets
+
+    def load_zip_member(self, zippath, name):
+        """
+        Reads and parses one member of a ZIP archive, see load_zip.
+        """
+        try:
+            # Every thread has its own handle of the archive
+            with zipfile.ZipFile(zippath) as archive:
+                raw_data = archive.read(name)
+        except Exception as e:
+            print(f"Error reading {name} from {zippath}: {e}")
+            return None
+        with instruments.timer("load", file=f"{os.path.basename(zippath)}/{name}"):
+            data = self.parse_stream(raw_data)
+        if data is None:
+            instruments.count("load failed")
+            print(f"Failed to load {name} from {zippath}")
+        return data
+
+    def parse_frame(self, filepath):
+        """
+        Reads the whole file into a DataFrame and extracts the columns, see load_xyc.
+        """
         try:
             # Detect the encoding
             encoding = self.detect_encoding(filepath)
@@ -133,6 +689,8 @@ class DataLoader:
             xlabel = column_mapping['time']
             ylabel = column_mapping['r']
 
+            x, y, c = self.sort_by_time(x, y, c)
+
             return {
                 'x': x,
                 'y': y,
@@ -187,6 +745,8 @@ class DataLoader:
                     xlabel = column_mapping['time']
                     ylabel = column_mapping['r']
 
+                    x, y, c = self.sort_by_time(x, y, c)
+
                     return {
                         'x': x,
                         'y': y,
@@ -204,4 +764,103 @@ class DataLoader:
             return None
         except Exception as e:
             print(f"Error loading data: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+class TailReader:
+    """
+    Follows a data file which is being appended to by the acquisition software.
+
+    The encoding, delimiter and columns are detected once from the beginning of the file
+    by DataLoader.detect_format, so the dialects of known instruments come from its FormatRegistry.
+    update() then reads only the bytes appended since the previous call, parses the complete
+    lines (a partially written last line is left for the next call) and appends them to
+    a ColumnBuffer, so the arrays grow in amortized O(1) per row. Rows are expected
+    to be appended in time order. If the file gets shorter (rewritten), it is read again.
+    """
+
+    def __init__(self, filepath, loader=None, block_bytes=TAIL_BLOCK_BYTES):
+        self.filepath = filepath
+        self.loader = loader if loader is not None else DataLoader(use_cache=False)
+        self.block_bytes = block_bytes
+        with open(filepath, 'rb') as f:
+            header = f.readline()
+        # Dialect of a known instrument or detected as by load_xyc; only the header contains text,
+        # common encodings are tried if it fails to decode
+        encoding, self.delimiter = self.loader.detect_format(self.loader.read_sample(filepath, 10000))
+        for encoding in [encoding, 'cp1250', 'latin1']:
+            try:
+                header.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        self.encoding = encoding
+        self.columns = list(pd.read_csv(io.BytesIO(header), delimiter=self.delimiter,
+                                        encoding=self.encoding, nrows=0).columns)
+        self.column_mapping = self.loader.map_columns(self.columns)
+        self.header_size = len(header)
+        self.reset()
+
+    def reset(self):
+        self.offset = self.header_size  # Position in the file after the last parsed line
+        self.buffer = ColumnBuffer(names=self.loader.buffer_names(self.column_mapping))
+
+    def read_block(self):
+        """
+        Parses complete lines from the current offset, at most block_bytes of them.
+
+        Returns:
+            bool: True if the block was full, so more data may follow.
+        """
+        with open(self.filepath, 'rb') as f:
+            f.seek(self.offset)
+            raw = f.read(self.block_bytes)
+        end = raw.rfind(b'\n') + 1
+        if end == 0:
+            return False
+        options = dict(delimiter=self.delimiter, encoding=self.encoding, header=None, names=self.columns,
+                       usecols=[self.column_mapping[key] for key in ('time', 'r', 'concentration', 'weight')
+                                if key in self.column_mapping])
+        try:
+            chunk = pd.read_csv(io.BytesIO(raw[:end]), dtype=np.float64, **options)
+        except pd.errors.EmptyDataError:
+            chunk = None  # Only blank lines, a subclass of ValueError
+        except ValueError:
+            # Non-numeric cells become NaN, as in DataLoader.iter_blocks
+            chunk = pd.read_csv(io.BytesIO(raw[:end]), dtype=str, **options).apply(pd.to_numeric, errors='coerce')
+        if chunk is not None:
+            self.buffer.append(self.loader.chunk_block(chunk, self.column_mapping))
+        self.offset += end
+        return len(raw) == self.block_bytes
+
+    def update(self):
+        """
+        Reads everything appended since the previous call.
+
+        Returns:
+            int: Number of new rows, -1 if the file was rewritten and has been read from the start.
+        """
+        rewritten = os.path.getsize(self.filepath) < self.offset
+        if rewritten:
+            self.reset()
+        size = len(self.buffer)
+        while self.read_block():
+            pass
+        return -1 if rewritten else len(self.buffer) - size
+
+    def data(self):
+        """
+        Returns the data in the same form as DataLoader.load_xyc. The arrays are views
+        of the buffer, they are replaced by new ones when the buffer grows.
+        """
+        data = {
+            'x': self.buffer['x'],
+            'y': self.buffer['y'],
+            'c': self.buffer['c'],
+            'xlabel': self.column_mapping['time'],
+            'ylabel': self.column_mapping['r'],
+            'zlabel': self.column_mapping.get('concentration', 'Concentration [null]')
+        }
+        if 'w' in self.buffer.names:
+            data['w'] = self.buffer['w']
+        return data
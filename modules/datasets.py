@@ -0,0 +1,38 @@
+# datasets.py
+
+class DatasetCollection:
+    """
+    Data sets loaded together (e.g. by DataLoader.load_many), in the order of loading.
+
+    Iterating gives (name, data) pairs. A data set is indexed by its position or by its name,
+    the file name, or "archive.zip/member" for members of ZIP archives. Paths which failed
+    to load are listed in 'failed'.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.paths = []
+        self.datasets = []
+        self.failed = []
+
+    def add(self, name, path, data):
+        self.names.append(name)
+        self.paths.append(path)
+        self.datasets.append(data)
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def __iter__(self):
+        return iter(zip(self.names, self.datasets))
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.index(key)
+        return self.datasets[key]
+
+    def index(self, name):
+        """
+        Returns the position of the first data set of the name.
+        """
+        return self.names.index(name)
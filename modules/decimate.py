@@ -0,0 +1,89 @@
+# decimate.py
+
+import numpy as np
+
+
+def minmax_envelope(x, y, n_bins):
+    """
+    Decimates (x, y) to the min/max envelope of n_bins equally long bins, two points per bin
+    in their original order, so the plotted line looks the same as the full data at the
+    resolution of n_bins pixels. Data shorter than 2 * n_bins are returned unchanged.
+    x must be sorted.
+    """
+    n = len(x)
+    n_bins = max(int(n_bins), 1)
+    if n <= 2 * n_bins:
+        return x, y
+
+    bin_size = n // n_bins
+    full = n_bins * bin_size
+    bins = y[:full].reshape(n_bins, bin_size)
+    i_min = np.argmin(bins, axis=1)
+    i_max = np.argmax(bins, axis=1)
+    base = np.arange(n_bins) * bin_size
+    idx = (np.column_stack((np.minimum(i_min, i_max), np.maximum(i_min, i_max))) + base[:, None]).ravel()
+    if full < n:
+        # Shorter last bin with the rest of the data
+        rest = y[full:]
+        idx = np.concatenate((idx, full + np.sort([np.argmin(rest), np.argmax(rest)])))
+    return x[idx], y[idx]
+
+
+class DecimatedLine:
+    """
+    Level-of-detail view of a long trace. The Line2D shows only the min/max envelope
+    of the data within the current x-limits, with as many bins as the axes are wide in pixels.
+    The full data stay untouched for fitting and export.
+    """
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.line = None  # Line2D created from the first view
+
+    def view(self, xlim, n_bins):
+        """
+        Returns decimated (x, y) within xlim, including one point beyond each limit,
+        so the line continues to the edges of the axes.
+        """
+        visible = self.visible(xlim)
+        return minmax_envelope(self.x[visible], self.y[visible], n_bins)
+
+    def visible(self, xlim):
+        """
+        Returns the slice of x within xlim, widened by one point at each end.
+        """
+        start = max(np.searchsorted(self.x, xlim[0], side='left') - 1, 0)
+        stop = min(np.searchsorted(self.x, xlim[1], side='right') + 1, len(self.x))
+        return slice(start, stop)
+
+    def set_data(self, x, y):
+        """
+        Replaces the full data, e.g. when a followed file grows.
+        """
+        self.x = x
+        self.y = y
+
+    def update(self, xlim, n_bins):
+        if self.line is not None:
+            self.line.set_data(*self.view(xlim, n_bins))
+
+
+class DecimatedCurve(DecimatedLine):
+    """
+    Level-of-detail view of a smooth curve y = func(x), e.g. a fitted function.
+    The curve is evaluated only at about 2 * n_bins points of x within the current x-limits,
+    so no y array of the full length of x is ever kept.
+    """
+
+    def __init__(self, x, func):
+        super().__init__(x, None)
+        self.func = func
+
+    def view(self, xlim, n_bins):
+        x = self.x[self.visible(xlim)]
+        step = max(len(x) // (2 * max(int(n_bins), 1)), 1)
+        if step > 1:
+            # A smooth curve needs no envelope, every step-th point and the last one are enough
+            x = np.append(x[::step], x[-1])
+        return x, self.func(x)
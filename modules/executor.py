@@ -0,0 +1,214 @@
+# executor.py
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules.fitter import Fitter
+from modules.instruments import instruments
+
+
+def fit_worker(fitter, fit_type, x, y, x0, weights=None):
+    """
+    Runs a single fit in a worker process. Must stay a module level function to be picklable.
+    Returns (params, stats) of Fitter.fit_stats, the stats are recorded by the main process.
+    """
+    return fitter.fit_stats(fit_type, x, y, x0, weights, cached=False)
+
+
+class FitExecutor:
+    """
+    Fits sections in parallel using a pool of processes.
+
+    Sections are independent during fitting, only the prev_y0 hand-off for t90 depends
+    on the order. Therefore all sections are fitted at once and then chained from left
+    to right with Fitter.apply_fit, which gives the same results as fitting one by one.
+
+    The pool is created on first use and kept for following calls; call shutdown()
+    (or use the executor as a context manager) to release the worker processes.
+    With max_workers=1 the sections are fitted serially in the calling process,
+    or in one background thread when started by start(). start() uses the background thread
+    also for less than POOL_MIN_SECTIONS sections, which are fitted faster than the pool
+    is started (processes are spawned on Windows and macOS).
+    """
+
+    POOL_MIN_SECTIONS = 8
+
+    def __init__(self, fitter=None, max_workers=None):
+        self.fitter = fitter if fitter is not None else Fitter()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def get_thread(self):
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1)
+        return self._thread
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._thread is not None:
+            self._thread.shutdown(wait=True, cancel_futures=True)
+            self._thread = None
+
+    def submit(self, x_data, y_data, section, fit_type, background=False, weights=None, serial=False):
+        """
+        Starts fitting of one section with its x and y data (and optional weights). Returns a tuple
+        (future of (params, stats) as from Fitter.fit_stats, first y value of the section),
+        or None if the section has not enough data
+        (the 'Comment' is set accordingly). In serial mode (max_workers=1 or serial=True)
+        the returned future is already done, unless background is True, then the fit runs
+        in the background thread.
+        """
+        if len(x_data) < 2:
+            section["Comment"] = "Insufficient data"
+            return None
+        x0 = x_data[0]  # x is sorted
+        serial = serial or self.max_workers == 1
+        if serial and background:
+            future = self.get_thread().submit(self.fitter.fit_stats, fit_type, x_data, y_data, x0, weights)
+        elif serial:
+            future = Future()
+            try:
+                future.set_result(self.fitter.fit_stats(fit_type, x_data, y_data, x0, weights))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            # Cached results are not sent to the workers, their fits are cached here when done
+            key = self.fitter.cache_key(fit_type, x_data, y_data, weights)
+            params = self.fitter.cached_fit(key)
+            if params is not None:
+                future = Future()
+                future.set_result((params, {"time": 0.0, "n": len(x_data), "nfev": 0, "status": "cached"}))
+            else:
+                future = self.get_pool().submit(fit_worker, self.fitter, fit_type, x_data, y_data, x0, weights)
+                future.add_done_callback(lambda done: self.store_result(key, done))
+        return future, y_data[0]
+
+    def store_result(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.fitter.store_fit(key, future.result()[0])
+
+    def start(self, data, sections, fit_type, indices=None):
+        """
+        Starts fitting of all sections of one data set (or the sections of the given indices)
+        without waiting for the results.
+        The returned FitJob is polled for finished sections, e.g. from the Tk event loop.
+        """
+        count = len(sections) if indices is None else len(indices)
+        # A few sections are not worth starting the pool, once it runs it is used for all
+        serial = count < self.POOL_MIN_SECTIONS and self._pool is None
+        return FitJob(self, data, sections, fit_type, background=True, serial=serial, indices=indices)
+
+    def fit_sections(self, data, sections, fit_type):
+        """
+        Fits all sections of one data set in parallel and chains the prev_y0/t90.
+        """
+        self.fit_files([(data, sections, fit_type)])
+
+    def fit_files(self, jobs):
+        """
+        Fits sections of many data sets at once.
+
+        Parameters:
+            jobs (list): Tuples (data, sections, fit_type), one per data set, sections being
+                         a SectionTable updated in place.
+        """
+        # All sections are submitted first, so the workers are busy across data sets
+        fit_jobs = [FitJob(self, data, sections, fit_type) for data, sections, fit_type in jobs]
+        for fit_job in fit_jobs:
+            fit_job.poll(wait=True)
+
+
+class FitJob:
+    """
+    Sections of one data set (all, or those of the given indices) being fitted by FitExecutor.
+
+    Results are stored by poll() in the order of sections, since the prev_y0 / t90 chain
+    goes from left to right; a finished section waits until all sections before it are stored.
+    cancel() drops the sections not stored yet, fits already running are left to finish
+    and their results are ignored.
+    """
+
+    def __init__(self, executor, data, sections, fit_type, background=False, serial=False, indices=None):
+        self.fitter = executor.fitter
+        self.sections = sections
+        self.fit_type = fit_type
+        # Section data are views given by cached start/stop indices
+        self.indices = list(range(len(sections)) if indices is None else sorted(indices))
+        starts, stops = sections.slices(data['x'])
+        weights = data.get('w')  # Optional weights of the points
+        self.pending = [executor.submit(data['x'][starts[idx]:stops[idx]], data['y'][starts[idx]:stops[idx]],
+                                        sections[idx], fit_type, background,
+                                        None if weights is None else weights[starts[idx]:stops[idx]], serial)
+                        for idx in self.indices]
+        self.stored = 0  # Number of sections stored so far
+        self.t90_pending = set()  # Sections stored (or re-chained) since the last batched t90
+        self.cancelled = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def done(self):
+        return self.cancelled or self.stored == len(self.pending)
+
+    def poll(self, wait=False):
+        """
+        Stores results of the sections fitted so far. With wait=True blocks until all are stored.
+        t90 of the stored sections is calculated for all of them at once (Fitter.calculate_t90_many),
+        with wait=True once for the whole job.
+
+        Returns:
+            list: Indices of the sections updated by this call.
+        """
+        updated = []
+        while not self.done():
+            idx = self.indices[self.stored]
+            pending = self.pending[self.stored]
+            if pending is not None:
+                future, y_first = pending
+                if not wait and not future.done():
+                    break
+                updated.extend(self.apply(idx, future, y_first))
+            else:
+                updated.append(idx)
+            self.stored += 1
+        if self.t90_pending:
+            self.fitter.calculate_t90_many(self.sections, sorted(self.t90_pending))
+            self.t90_pending.clear()
+        return sorted(set(updated))
+
+    def apply(self, idx, future, y_first):
+        try:
+            params, stats = future.result()
+        except Exception as e:
+            instruments.count("fit exceptions")
+            self.sections[idx]["Type"] = self.fit_type
+            self.sections[idx]["Comment"] = f"Exception: {e}"
+            self.t90_pending.discard(idx)
+            return [idx]
+        self.fitter.record_fit(self.fit_type, stats)
+        updated = self.fitter.apply_fit(self.sections, idx, self.fit_type, params, y_first, t90=False)
+        if params is None:
+            self.t90_pending.discard(idx)  # Chained from the preceding section, but not fitted
+        else:
+            self.t90_pending.update(updated)
+        return updated
+
+    def cancel(self):
+        for pending in self.pending[self.stored:]:
+            if pending is not None:
+                pending[0].cancel()
+        self.cancelled = True
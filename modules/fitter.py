@@ -1,49 +1,625 @@
 # fitter.py
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import numpy as np
-from scipy.optimize import curve_fit, root_scalar
+from scipy.optimize import curve_fit, least_squares, minimize_scalar
 import pandas as pd
 
+from modules.instruments import instruments
+from modules.response_times import RESPONSE_LEVELS, crossing_time, solve_response_times
+from modules.sections import section_slice
+
+
+class FitBudgetExceeded(Exception):
+    """
+    Raised from the fitted function when the time budget of the fit is used up.
+    """
+
 
 class Fitter:
-    def single_exp_decay(self, x, y, x0):
+    SOLVERS = ("curve_fit", "varpro")
+    LOSSES = ("linear", "soft_l1", "huber")  # Least squares and robust losses of scipy least_squares
+    PARAM_NAMES = ("y0", "A1", "tau1", "A2", "tau2")  # Columns of packed parameter arrays
+    FIT_CODES = {"Single Exp. Decay": 1, "Double Exp. Decay": 2, "Aux": 3}  # Unknown/unfitted = 0
+
+    def __init__(self, use_jac=True, solver="curve_fit", cache_size=256, loss="linear", f_scale=None,
+                 max_nfev=10000, time_budget=None):
+        self.use_jac = use_jac  # Analytic Jacobians, False = finite differences estimated by curve_fit
+        self.solver = solver  # "curve_fit" (all parameters jointly) or "varpro" (variable projection)
+        self.loss = loss  # "linear" (least squares), robust "soft_l1" or "huber" limit the effect of outliers
+        self.f_scale = f_scale  # Residual above which robust losses down-weight a point, None = noise of the data
+        self.max_nfev = max_nfev  # Budget of function evaluations of a fit
+        self.time_budget = time_budget  # Budget of wall time of a fit [s], None = unlimited
+        self.nfev = 0  # Function evaluations of curve_fit calls, accumulated until reset by the caller
+        self.njev = 0  # Evaluations of the analytic Jacobian, accumulated the same way
+        self.budget_hits = 0  # Fits stopped by the time or max_nfev budget, accumulated the same way
+        self.cache_size = cache_size  # Fit results kept for repeated fits, 0 = no caching
+        self.cache_hits = 0
+        self._cache = OrderedDict()  # Least recently used first
+        self._cache_lock = threading.Lock()  # Fits run also in a background thread
+
+    def __getstate__(self):
+        # Worker processes get the fitter without the cache, results are cached by the parent
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        del state['_cache_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+    def cache_key(self, fit_type, x, y, weights=None):
+        """
+        Key of a fit result: hash of the section data (and weights), the fit type and the solver options.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for values in (x, y) if weights is None else (x, y, weights):
+            digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        return (digest.hexdigest(), fit_type, self.solver, self.use_jac, self.loss, self.f_scale,
+                self.max_nfev, self.time_budget)
+
+    def cached_fit(self, key):
+        """
+        Returns a copy of the cached parameters, or None if the key is not cached.
+        """
+        with self._cache_lock:
+            params = self._cache.get(key)
+            if params is None:
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+        instruments.count("fit cache hits")
+        return params.copy()
+
+    def store_fit(self, key, params):
+        """
+        Caches fitted parameters, the least recently used results are dropped above cache_size.
+        """
+        if params is None or self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = np.array(params, dtype=float)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self):
+        """
+        Drops all cached fit results, called when the loaded data are modified.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def run_curve_fit(self, func, jac, x, y, p0, weights=None):
+        """
+        Calls curve_fit with the analytic Jacobian (if enabled) and counts function evaluations.
+
+        Robust losses run the trust region reflective method of least_squares, whose soft_l1/huber loss
+        grows only linearly for residuals above f_scale, so spikes do not pull the fit.
+        Weights (per point, 0 = ignored) scale the residuals by sqrt(weight). When max_nfev evaluations
+        or the time budget are used up, the fit stops and the best parameters evaluated so far
+        are returned (counted in budget_hits).
+        """
+        kwargs = {}
+        if self.loss != "linear":
+            kwargs = {"method": "trf", "loss": self.loss, "f_scale": self.f_scale or self.noise_scale(y)}
+        sigma = None
+        if weights is not None:
+            with np.errstate(divide='ignore'):
+                sigma = 1 / np.sqrt(np.clip(weights, 0, None))
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        best = {"cost": np.inf, "params": None, "nfev": 0}
+
+        def tracked(x, *params):
+            values = func(x, *params)
+            best["nfev"] += 1
+            residual = values - y if sigma is None else (values - y) / sigma
+            cost = self.loss_cost(residual, kwargs.get("f_scale", 1.0))
+            if cost < best["cost"]:
+                best.update(cost=cost, params=np.array(params))
+            if deadline is not None and time.perf_counter() > deadline:
+                raise FitBudgetExceeded()
+            return values
+
+        try:
+            params, _, infodict, _, _ = curve_fit(tracked, x, y, p0=p0, sigma=sigma, maxfev=self.max_nfev,
+                                                  jac=jac if self.use_jac else None, full_output=True, **kwargs)
+        except (FitBudgetExceeded, RuntimeError):
+            # RuntimeError: max_nfev evaluations done without convergence
+            if best["params"] is None or not np.isfinite(best["cost"]):
+                raise RuntimeError("Fit stopped without any finite result.")
+            self.nfev += best["nfev"]
+            self.budget_hits += 1
+            return best["params"]
+        self.nfev += infodict['nfev']
+        self.njev += infodict.get('njev', 0)
+        return params
+
+    def loss_cost(self, residual, f_scale=1.0):
+        """
+        Returns the cost of residuals under the loss, as minimized by least_squares (up to a constant factor).
+        """
+        z = np.square(residual / f_scale)
+        if self.loss == "soft_l1":
+            rho = 2 * (np.sqrt(1 + z) - 1)
+        elif self.loss == "huber":
+            rho = np.where(z <= 1, z, 2 * np.sqrt(z) - 1)
+        else:
+            rho = z
+        return np.sum(rho)
+
+    def noise_scale(self, y):
+        """
+        Robust estimate of the noise of y (MAD of differences of neighbours), the f_scale of robust losses.
+        """
+        diff = np.diff(y)
+        noise = 1.4826 * np.median(np.abs(diff - np.median(diff))) / np.sqrt(2) if len(diff) else 0.0
+        if not noise > 0:
+            noise = np.std(y)
+        return noise if noise > 0 else 1.0
+
+    def single_exp_decay(self, x, y, x0, weights=None):
         def func(x, y0, A1, tau1):
             return y0 + A1 * np.exp(-(x - x0) / tau1)
 
-        if (y[0] > y[-1]):
-            p0 = [y.min(), - (y.max()-y.min()), (x.max()-x.min())/100]
+        def jac(x, y0, A1, tau1):
+            e1 = np.exp(-(x - x0) / tau1)
+            return np.column_stack((np.ones_like(x), e1, A1 * e1 * (x - x0) / tau1**2))
+
+        if self.solver == "varpro":
+            p0 = self.varpro_fit(x, y, x0, 1)
+            if p0 is None or not self.refines_varpro(weights):
+                return p0
         else:
-            p0 = [y.max(), + (y.max()-y.min()), (x.max()-x.min())/100]
+            p0 = self.estimate_p0(x, y, x0, 1)
+        if p0 is None:
+            if (y[0] > y[-1]):
+                p0 = [y.min(), - (y.max()-y.min()), (x.max()-x.min())/100]
+            else:
+                p0 = [y.max(), + (y.max()-y.min()), (x.max()-x.min())/100]
         try:
-            params, _ = curve_fit(func, x, y, p0=p0, maxfev=10000)
-            return params
+            return self.run_curve_fit(func, jac, x, y, p0, weights)
         except RuntimeError:
             return None
 
-    def double_exp_decay(self, x, y, x0):
+    def double_exp_decay(self, x, y, x0, weights=None):
         def func(x, y0, A1, tau1, A2, tau2):
             return y0 + A1 * np.exp(-(x - x0) / tau1) + A2 * np.exp(-(x - x0) / tau2)
 
-        p_single = self.single_exp_decay(x, y, x0)
-        p0 = np.append(p_single,p_single[1:])
+        def jac(x, y0, A1, tau1, A2, tau2):
+            e1 = np.exp(-(x - x0) / tau1)
+            e2 = np.exp(-(x - x0) / tau2)
+            return np.column_stack((np.ones_like(x), e1, A1 * e1 * (x - x0) / tau1**2,
+                                    e2, A2 * e2 * (x - x0) / tau2**2))
+
+        if self.solver == "varpro":
+            p0 = self.varpro_fit(x, y, x0, 2)
+            if p0 is None or not self.refines_varpro(weights):
+                return p0
+        else:
+            p0 = self.estimate_p0(x, y, x0, 2)
+        if p0 is None:
+            # Two exponentials cannot be separated in closed form, seed from the single exponential fit
+            p_single = self.single_exp_decay(x, y, x0, weights)
+            if p_single is None:
+                return None
+            y0, A1, tau1 = p_single
+            p0 = [y0, A1 / 2, tau1 / 3, A1 / 2, tau1 * 3]
 
         try:
-            params, _ = curve_fit(func, x, y, p0=p0, maxfev=10000)
-            return params
+            return self.run_curve_fit(func, jac, x, y, p0, weights)
         except RuntimeError:
             return None
 
-    def auxiliary(self, x, y, x0):
+    def estimate_p0(self, x, y, x0, n_exp):
+        """
+        Non-iterative initial guess of exponential parameters by the successive integration
+        (integral equation) method, O(n).
+
+        y0 + A1*exp(-t/tau1) solves y' = -(y - y0)/tau1, integrated once it is linear in the
+        running integral S1 of y, so -1/tau1 is the coefficient of S1 in a linear regression.
+        The double exponential solves a 2nd order equation, integrated twice it is linear
+        in S1 and the double integral S2 and -1/tau1, -1/tau2 are roots of r^2 - a*r - b = 0.
+        With known taus, y0 and amplitudes are solved by linear least squares.
+
+        Returns:
+            list: [y0, A1, tau1] or [y0, A1, tau1, A2, tau2], None if the data do not give
+                  positive (and for the double exponential distinct) taus.
+        """
+        t = x - x0
+        if len(t) < 2 * n_exp + 2 or t.max() <= t.min():
+            return None
+
+        def lstsq(columns, target):
+            # Columns are scaled to unit norm, the integrals are many orders above y
+            basis = np.column_stack(columns)
+            norm = np.linalg.norm(basis, axis=0)
+            norm[norm == 0] = 1
+            coef, _, _, _ = np.linalg.lstsq(basis / norm, target, rcond=None)
+            return coef / norm
+
+        dt = np.diff(t)
+        S1 = np.concatenate(([0.0], np.cumsum((y[1:] + y[:-1]) / 2 * dt)))
+        tt = t - t[0]
+        try:
+            if n_exp == 1:
+                coef = lstsq([S1, tt, np.ones_like(t)], y)
+                rates = np.array([-coef[0]])
+            else:
+                S2 = np.concatenate(([0.0], np.cumsum((S1[1:] + S1[:-1]) / 2 * dt)))
+                coef = lstsq([S1, S2, tt**2, tt, np.ones_like(t)], y)
+                a, b = coef[0], coef[1]
+                disc = a**2 + 4 * b
+                if disc <= 0:  # Complex or double root, no two distinct exponentials
+                    return None
+                rates = -(a + np.array([-1, 1]) * np.sqrt(disc)) / 2  # Faster rate first, tau1 < tau2
+            if not np.all(np.isfinite(rates)) or np.any(rates <= 0):
+                return None
+            taus = 1 / rates
+            if n_exp == 2 and taus[1] / taus[0] < 1.01:
+                return None
+            coef = lstsq([np.ones_like(t)] + [np.exp(-t / tau) for tau in taus], y)
+        except (np.linalg.LinAlgError, ValueError):
+            return None
+        if not np.all(np.isfinite(coef)):
+            return None
+
+        p0 = [coef[0]]
+        for A, tau in zip(coef[1:], taus):
+            p0.extend([A, tau])
+        return p0
+
+    def auxiliary(self, x, y, x0, weights=None):
         def func(x, y0, A1):
             return y0 + (x - x0) * A1
 
+        def jac(x, y0, A1):
+            return np.column_stack((np.ones_like(x), x - x0))
+
         p0 = [y.min(), 0.0]
         try:
-            params, _ = curve_fit(func, x, y, p0=p0, maxfev=10000)
-            return params
+            return self.run_curve_fit(func, jac, x, y, p0, weights)
         except RuntimeError:
             return None
 
+    def refines_varpro(self, weights):
+        """
+        Variable projection solves plain unweighted least squares; with a robust loss or weights
+        its result is the starting point of the joint fit.
+        """
+        return self.loss != "linear" or weights is not None
+
+    def varpro_fit(self, x, y, x0, n_exp, n_grid=40, min_ratio=1.5, grid_points=2000):
+        """
+        Fits y0 + A1*exp(-(x-x0)/tau1) [+ A2*exp(-(x-x0)/tau2)] by variable projection.
+        For any candidate taus the offset and amplitudes are solved by linear least squares,
+        so only 1 or 2 time constants are searched nonlinearly, starting from the taus of
+        estimate_p0. Where it gives none, the best tau (pair of taus) of a log-spaced grid is used,
+        evaluated on at most grid_points points of the data. In the double exponential tau2 is kept
+        at least min_ratio times tau1.
+
+        Returns:
+            array: [y0, A1, tau1] or [y0, A1, tau1, A2, tau2], None if the fit failed.
+        """
+        t = x - x0
+        span = t.max()
+        if span <= 0 or len(t) < n_exp + 2:
+            return None
+        dt = np.min(np.diff(t)[np.diff(t) > 0], initial=span)
+        log_bounds = (np.log(dt / 2), np.log(span * 10))
+
+        def linear(log_taus):
+            # Orthonormal basis of the offset and exponentials, the amplitudes are its projection of y
+            exps = [np.exp(-t / np.exp(lt)) for lt in log_taus]
+            basis = np.column_stack([np.ones_like(t)] + exps)
+            q, r = np.linalg.qr(basis)
+            coef = np.linalg.solve(r, q.T @ y)
+            self.nfev += 1
+            return basis, q, coef
+
+        last = {}  # least_squares evaluates the residual and the Jacobian at the same point
+
+        def evaluate(log_taus):
+            key = tuple(log_taus)
+            if last.get("key") != key:
+                last.update(key=key, value=linear(log_taus))
+            return last["value"]
+
+        def residual(log_taus):
+            basis, _, coef = evaluate(log_taus)
+            return basis @ coef - y
+
+        def jacobian(log_taus):
+            # Kaufman's approximation: derivatives of the exponentials (by log tau) times the amplitudes,
+            # projected out of the span of the basis
+            basis, q, coef = evaluate(log_taus)
+            columns = []
+            for k, lt in enumerate(log_taus):
+                d = basis[:, k + 1] * (t / np.exp(lt)) * coef[k + 1]
+                columns.append(d - q @ (q.T @ d))
+            self.njev += 1
+            return np.column_stack(columns)
+
+        seed = self.estimate_p0(x, y, x0, n_exp)
+        if seed is not None:
+            log_start = np.log(seed[2::2])
+        else:
+            step = max(len(t) // grid_points, 1)
+            log_start = self.varpro_grid(t[::step], y[::step], n_exp, np.linspace(*log_bounds, n_grid), min_ratio)
+            if log_start is None:
+                return None
+
+        try:
+            if n_exp == 1:
+                lower, upper = [log_bounds[0]], [log_bounds[1]]
+                start = log_start
+                taus_of = lambda p: [p[0]]
+                chain = np.eye(1)
+            else:
+                # Refined in (log tau1, log tau2/tau1) to keep the taus apart
+                lower = [log_bounds[0], np.log(min_ratio)]
+                upper = [log_bounds[1], log_bounds[1] - log_bounds[0]]
+                start = [log_start[0], log_start[1] - log_start[0]]
+                taus_of = lambda p: [p[0], p[0] + p[1]]
+                chain = np.array([[1.0, 0.0], [1.0, 1.0]])  # d(log taus) / d(p)
+            # The start must lie within the bounds
+            margin = 1e-9 * (np.array(upper) - np.array(lower))
+            start = np.clip(start, np.array(lower) + margin, np.array(upper) - margin)
+            result = least_squares(lambda p: residual(taus_of(p)), start, bounds=(lower, upper),
+                                   jac=lambda p: jacobian(taus_of(p)) @ chain)
+            log_taus = taus_of(result.x)
+            _, _, coef = linear(log_taus)
+        except (np.linalg.LinAlgError, ValueError):
+            return None
+        if not np.all(np.isfinite(coef)):
+            return None
+
+        taus = np.exp(log_taus)
+        params = [coef[0]]
+        for A, tau in zip(coef[1:], taus):
+            params.extend([A, tau])
+        return np.array(params)
+
+    def varpro_grid(self, t, y, n_exp, log_grid, min_ratio):
+        """
+        Best log tau (pair of log taus) of the grid for varpro_fit, the residual sum of squares
+        of every grid tau (every pair tau1 < tau2) is solved in closed form. Returns None if no
+        candidate is valid.
+        """
+        # Centering removes the offset y0 from the linear problem
+        yc = y - y.mean()
+        yy = yc @ yc
+        E = np.exp(-t[:, None] / np.exp(log_grid)[None, :])
+        Ec = E - E.mean(axis=0)
+        C = Ec.T @ Ec
+        b = Ec.T @ yc
+        diag = np.maximum(np.diag(C), np.finfo(float).tiny)
+        self.nfev += len(log_grid)
+        if n_exp == 1:
+            return [log_grid[int(np.argmin(yy - b**2 / diag))]]
+        # All pairs tau1 < tau2 of the grid solved at once by 2x2 normal equations.
+        # Nearly equal taus give collinear exponentials with huge cancelling amplitudes,
+        # so the taus must differ at least by min_ratio and amplitudes must stay within
+        # a multiple of the data range.
+        i, j = np.triu_indices(len(log_grid), k=1)
+        det = diag[i] * diag[j] - C[i, j]**2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a1 = (diag[j] * b[i] - C[i, j] * b[j]) / det
+            a2 = (diag[i] * b[j] - C[i, j] * b[i]) / det
+            ssr = yy - (a1 * b[i] + a2 * b[j])
+        a_max = 10 * np.ptp(y)
+        invalid = (~np.isfinite(ssr) | (det <= 0) | (log_grid[j] - log_grid[i] < np.log(min_ratio))
+                   | (np.abs(a1) > a_max) | (np.abs(a2) > a_max))
+        ssr[invalid] = np.inf
+        k = int(np.argmin(ssr))
+        if not np.isfinite(ssr[k]):
+            return None
+        return [log_grid[i[k]], log_grid[j[k]]]
+
+    def compare_jacobian(self, fit_type, x, y, x0, repeat=3):
+        """
+        Fits the same data with analytic and with finite-difference Jacobian.
+
+        Returns:
+            dict: For 'analytic' and 'numeric' a dict with the best wall 'time' [s] of the repeats,
+                  'nfev' (function evaluations), 'njev' (Jacobian evaluations) and fitted 'params'
+                  (None if the fit failed).
+        """
+        use_jac = self.use_jac
+        results = {}
+        try:
+            for name, flag in (("analytic", True), ("numeric", False)):
+                self.use_jac = flag
+                best = np.inf
+                for _ in range(repeat):
+                    self.nfev = 0
+                    self.njev = 0
+                    start = time.perf_counter()
+                    try:
+                        params = self.fit_model(fit_type, x, y, x0)
+                    except Exception:
+                        params = None
+                    best = min(best, time.perf_counter() - start)
+                results[name] = {"time": best, "nfev": self.nfev, "njev": self.njev, "params": params}
+        finally:
+            self.use_jac = use_jac
+        return results
+
+    def fit(self, fit_type, x, y, x0, weights=None):
+        """
+        Fits the data with the function selected by the fit type name.
+        Returns fitted parameters or None if the fit failed.
+        Results are cached, a repeated fit of the same data returns the stored parameters.
+        Optional weights of the points (0 = ignored) are used in the joint fit, see run_curve_fit.
+        """
+        if self.cache_size <= 0:
+            return self.fit_model(fit_type, x, y, x0, weights)
+        key = self.cache_key(fit_type, x, y, weights)
+        params = self.cached_fit(key)
+        if params is None:
+            params = self.fit_model(fit_type, x, y, x0, weights)
+            self.store_fit(key, params)
+        return params
+
+    def fit_stats(self, fit_type, x, y, x0, weights=None, cached=True):
+        """
+        Fits like fit() (or fit_model() without the cache) and measures the fit.
+
+        Returns:
+            tuple: (params, stats) - stats is a dict with the wall 'time' [s], number of points 'n',
+                   function evaluations 'nfev' and 'status' ("ok", "cached", "budget" if stopped
+                   by the time budget or max_nfev, or "no result").
+        """
+        nfev, cache_hits, budget_hits = self.nfev, self.cache_hits, self.budget_hits
+        start = time.perf_counter()
+        if cached:
+            params = self.fit(fit_type, x, y, x0, weights)
+        else:
+            params = self.fit_model(fit_type, x, y, x0, weights)
+        status = "ok" if params is not None else "no result"
+        if self.cache_hits != cache_hits:
+            status = "cached"
+        elif self.budget_hits != budget_hits:
+            status = "budget"
+        stats = {"time": time.perf_counter() - start, "n": len(x), "nfev": self.nfev - nfev, "status": status}
+        return params, stats
+
+    def record_fit(self, fit_type, stats):
+        """
+        Records a measured fit (see fit_stats) by the instruments, cached results are only counted.
+        """
+        if stats["status"] == "cached":
+            return
+        instruments.record("fit", stats["time"], type=fit_type, **{key: value for key, value in stats.items()
+                                                                  if key != "time"})
+
+    def fit_model(self, fit_type, x, y, x0, weights=None):
+        """
+        Fits the data without the cache.
+        """
+        if fit_type == "Single Exp. Decay":
+            return self.single_exp_decay(x, y, x0, weights)
+        elif fit_type == "Double Exp. Decay":
+            return self.double_exp_decay(x, y, x0, weights)
+        elif fit_type == "Aux":
+            return self.auxiliary(x, y, x0, weights)
+        return None
+
+    def section_data(self, data, section):
+        """
+        Returns x and y data (views) within the From/To range of the section, x must be sorted.
+        """
+        data_slice = section_slice(data['x'], section["From"], section["To"])
+        return data['x'][data_slice], data['y'][data_slice]
+
+    def section_weights(self, data, section):
+        """
+        Returns the optional weights of points ('w' of the data) within the section, None without weights.
+        """
+        if data.get('w') is None:
+            return None
+        return data['w'][section_slice(data['x'], section["From"], section["To"])]
+
+    def fit_section(self, data, sections, idx, fit_type):
+        """
+        Fits one section of the loaded data with the given fit type.
+        The fitted y0 is handed over to the following section as its prev_y0,
+        then t90 of the section is calculated.
+        Results (or an error message in 'Comment') are stored in sections[idx].
+
+        Returns:
+            list: Indices of the sections updated (the fitted one and possibly the following one).
+        """
+        section = sections[idx]
+        try:
+            # Extract data for the current section
+            x_data, y_data = self.section_data(data, section)
+
+            if len(x_data) < 2:
+                section["Comment"] = "Insufficient data"
+                return [idx]
+
+            x0 = x_data[0]  # x is sorted
+            section["Type"] = fit_type
+            params, stats = self.fit_stats(fit_type, x_data, y_data, x0, self.section_weights(data, section))
+            self.record_fit(fit_type, stats)
+
+        except Exception as e:
+            instruments.count("fit exceptions")
+            section["Comment"] = f"Exception: {e}"
+            return [idx]
+
+        return self.apply_fit(sections, idx, fit_type, params, y_data[0])
+
+    def apply_fit(self, sections, idx, fit_type, params, y_first, t90=True):
+        """
+        Stores fitted parameters into sections[idx], calculates t90 and propagates
+        the new y0 to the following section. This is the sequential part of fitting - sections fitted
+        independently (e.g. in parallel) are chained by calling it from left to right.
+        y_first is the first y value of the section, used as prev_y0 of the very first section.
+        With t90=False, t90 of the updated sections is left to calculate_t90_many.
+
+        Returns:
+            list: Indices of the sections updated.
+        """
+        section = sections[idx]
+        try:
+            section["Type"] = fit_type
+            if params is None:
+                section["Comment"] = "error"
+                return [idx]
+
+            # Parameters not used by the fit type are NaN
+            values = np.full(len(self.PARAM_NAMES), np.nan)
+            values[:len(params)] = params
+            for name, value in zip(self.PARAM_NAMES, values):
+                section[name] = value
+            section["tau90"] = np.nan
+
+            if (idx==0):  # first section does not have prev_y0
+                section["prev_y0"] = y_first
+
+            if t90:
+                self.calculate_t90(section)
+
+        except Exception as e:
+            section["Comment"] = f"Exception: {e}"
+            return [idx]
+
+        if (idx + 1) < len(sections) and self.propagate(sections, idx + 1, t90=t90):
+            return [idx, idx + 1]
+        return [idx]
+
+    def propagate(self, sections, idx, y_first=None, t90=True):
+        """
+        Updates prev_y0 of sections[idx] after its predecessor changed (was refitted or removed)
+        and recalculates its t90, without refitting.
+
+        Sections form a chain where prev_y0 of a section is y0 of the preceding one
+        (y_first, the first y value of the section, for the very first one). t90 depends
+        on prev_y0, but y0 does not, so the change stops at this section and a fix-up costs O(1).
+
+        Returns:
+            bool: True if prev_y0 of the section changed.
+        """
+        section = sections[idx]
+        prev_y0 = y_first if idx == 0 else sections[idx - 1]["y0"]
+        if prev_y0 is None:
+            return False
+        prev_y0 = float(prev_y0)
+        old = float(section["prev_y0"])
+        if prev_y0 == old or (np.isnan(prev_y0) and np.isnan(old)):
+            return False
+        section["prev_y0"] = prev_y0
+        if t90 and section["Type"] and not np.isnan(section["y0"]):  # Fitted
+            self.calculate_t90(section)
+        return True
+
     def get_fit_curve(self, x, fit_type, fit_params, x0):
         if fit_type == "Single Exp. Decay":
             y0 = float(fit_params["y0"])
@@ -64,12 +640,69 @@ class Fitter:
         else:
             return np.zeros_like(x)
 
+    def pack_params(self, sections):
+        """
+        Packs sections into arrays for batched evaluation of fitted curves.
+
+        Parameters:
+            sections: Structured array of sections (SectionTable.data or its subset).
+
+        Returns:
+            tuple: (codes, params, x_from, x_to) - fit type codes (FIT_CODES) of shape (S,),
+                   parameters of shape (S, 5) in PARAM_NAMES order (NaN where not used or not fitted)
+                   and section ranges of shape (S,).
+        """
+        codes = np.array([self.FIT_CODES.get(str(fit_type), 0) for fit_type in sections["Type"]], dtype=int)
+        params = np.column_stack([sections[name] for name in self.PARAM_NAMES]).reshape(-1, 5)
+        return codes, params, sections["From"].astype(float), sections["To"].astype(float)
+
+    def model_values(self, codes, params, t):
+        """
+        Evaluates fitted functions elementwise, codes/params broadcast against t = x - x0.
+        Returns NaN for unknown or unfitted sections.
+        """
+        y0, A1, tau1, A2, tau2 = np.moveaxis(params, -1, 0)
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            exp_values = y0 + A1 * np.exp(-t / tau1) + np.where(codes == 2, A2 * np.exp(-t / tau2), 0.0)
+            aux_values = y0 + A1 * t
+        return np.where(codes == 3, aux_values, np.where((codes == 1) | (codes == 2), exp_values, np.nan))
+
+    def evaluate_curves(self, x, codes, params, x_from, x_to=None):
+        """
+        Evaluates fitted curves of all sections on one x-grid in a single vectorized pass.
+        Curve i starts at x_from[i] (its x0) and ends at x_to[i] (the end of x if x_to is None).
+
+        Returns:
+            array: Shape (S, len(x)), NaN outside of the curve ranges.
+        """
+        x = np.asarray(x, dtype=float)
+        t = x[None, :] - x_from[:, None]
+        curves = self.model_values(codes[:, None], params[:, None, :], t)
+        outside = t < 0
+        if x_to is not None:
+            outside |= x[None, :] > x_to[:, None]
+        curves[outside] = np.nan
+        return curves
+
+    def curve_function(self, code, params, x0):
+        """
+        Returns the fitted function of one section as y = f(x), with its fit type code
+        and parameter row from pack_params and x0 being the section From.
+        """
+        return lambda x: self.model_values(code, params, x - x0)
+
     def save_project(self, filepath, fits):
-        df = pd.DataFrame(fits)
+        """
+        Saves sections (SectionTable or DataFrame) as CSV with values in scientific format.
+        """
+        df = fits if isinstance(fits, pd.DataFrame) else fits.to_frame()
         df.to_csv(filepath, index=False, float_format='%.3E')
 
     def export_fits(self, filepath, fits):
-        df = pd.DataFrame(fits)
+        """
+        Exports sections (SectionTable or DataFrame) to CSV (';' delimited) or Excel.
+        """
+        df = fits if isinstance(fits, pd.DataFrame) else fits.to_frame()
         if filepath.endswith('.xls') or filepath.endswith('.xlsx'):
             df.to_excel(filepath, index=False, engine='openpyxl')
         else:
@@ -80,59 +713,72 @@ class Fitter:
         Calculates t90 for a fitted section.
         The starting value is prev_y0 if provided;
         for the very first section, it's the y value at x0.
-        Stores the result in section['tau90'].
+        Stores the result in section['tau90'] (NaN if it cannot be calculated).
         """
-        fit_type = section['Type']
-        x0 = float(section['From'])  # Ensure x0 is a float
-        y0 = float(section['y0'])
-        y_start = float(section['prev_y0'])
-        try:
-            total_change = y_start - y0
-
-            if total_change == 0:
-                section['tau90'] = ''
-                section['Comment'] = 'No change detected'
-                return
-
-            if fit_type == 'Single Exp. Decay':
-                tau1 = float(section['tau1'])
+        with instruments.timer("t90"):
+            fit_type = section['Type']
+            try:
+                total_change = float(section['prev_y0']) - float(section['y0'])
 
-                # Solve for t90
-                # exp(-(t90 - x0)/tau1) = 0.1
-                #t90 = x0 - tau1 * np.log(0.1)
-                t90 = - tau1 * np.log(0.1)
+                if total_change == 0:
+                    section['tau90'] = np.nan
+                    section['Comment'] = 'No change detected'
+                    return
 
-                section['tau90'] = f"{t90:.5G}"
-
-            elif fit_type == 'Double Exp. Decay':
-                A1 = float(section['A1'])
-                tau1 = float(section['tau1'])
-                A2 = float(section['A2'])
-                tau2 = float(section['tau2'])
-
-                # Target value at t90 (90% approach to y0)
-                target_value = y0 + 0.1 * total_change
+                if fit_type == 'Single Exp. Decay':
+                    t90 = -float(section['tau1']) * np.log(0.1)
+                elif fit_type == 'Double Exp. Decay':
+                    # Normalized so that the curve decays towards 0 from the side of prev_y0
+                    t90 = crossing_time(section['A1'] / total_change, section['tau1'],
+                                        section['A2'] / total_change, section['tau2'], 0.1)
+                else:
+                    section['tau90'] = np.nan
+                    section['Comment'] = 'Unknown fit type'
+                    return
 
-                def func(t):
-                    return y0 + A1 * np.exp(-(t - x0) / tau1) + A2 * np.exp(-(t - x0) / tau2) - target_value
+                section['tau90'] = t90
+                if np.isnan(t90):
+                    # The fitted curve does not come from the side of prev_y0, e.g. amplitudes of the wrong sign
+                    section['Comment'] = 't90 not reached'
 
-                # Set reasonable bounds for t90
-                t_min = x0
-                t_max = x0 + 10 * max(tau1, tau2)
+            except Exception as e:
+                section['tau90'] = np.nan
+                section['Comment'] = f"Error calculating t90: {e}"
 
-                # Use root-finding to solve for t90
-                result = root_scalar(func, bracket=[t_min, t_max], method='brentq')
+    def response_times(self, sections, levels=RESPONSE_LEVELS):
+        """
+        Calculates response times (t10, t50, t63 and t90 by default) of all fitted sections at once.
 
-                if result.converged:
-                    t90 = result.root - x0
-                    section['tau90'] = f"{t90:.1f}"
-                else:
-                    section['tau90'] = 'err.'
+        Parameters:
+            sections: Structured array of sections (SectionTable.data or its subset) with prev_y0 chained.
 
-            else:
-                section['tau90'] = ''
-                section['Comment'] = 'Unknown fit type'
+        Returns:
+            dict: Array of times for every level name, one per section (NaN if not available).
+        """
+        with instruments.timer("response times (batched)"):
+            codes, params, _, _ = self.pack_params(sections)
+            return solve_response_times(codes, params, sections["prev_y0"], levels)
 
-        except Exception as e:
-            section['tau90'] = ''
-            section['Comment'] = f"Error calculating t90: {e}"
\ No newline at end of file
+    def calculate_t90_many(self, sections, indices):
+        """
+        Calculates t90 of the fitted sections of the indices at once, the same as calculate_t90
+        for each of them. Sections fitted in a batch (FitJob) are chained with t90=False
+        and get their t90 by this call.
+        """
+        indices = np.array([idx for idx in indices
+                            if sections[idx]["Type"] and not np.isnan(sections[idx]["y0"])], dtype=int)
+        if not len(indices):
+            return
+        rows = sections.data[indices]
+        t90 = self.response_times(rows, {"t90": 0.9})["t90"]
+        no_change = rows["prev_y0"] - rows["y0"] == 0
+        unknown = ~np.isin(rows["Type"], ('Single Exp. Decay', 'Double Exp. Decay'))
+        t90[no_change | unknown] = np.nan
+        sections.data["tau90"][indices] = t90
+        for idx, value, change, other in zip(indices, t90, no_change, unknown):
+            if change:
+                sections[idx]["Comment"] = 'No change detected'
+            elif other:
+                sections[idx]["Comment"] = 'Unknown fit type'
+            elif np.isnan(value):
+                sections[idx]["Comment"] = 't90 not reached'
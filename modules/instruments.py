@@ -0,0 +1,135 @@
+# instruments.py
+
+import cProfile
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Instruments:
+    """
+    Opt-in timers and counters of the hot paths (loading, format detection, fits, t90, drawing).
+
+    Disabled by default, then timer() and count() cost a function call and record nothing.
+    For every timer the count, total, maximum and last time are kept; single events with
+    details (e.g. a fit with its number of function evaluations and status) are kept in a bounded
+    log. Everything is exported by to_dict()/save_json(). A cProfile profile of the whole
+    application can be recorded in addition and dumped for pstats or snakeviz.
+
+    Timings are recorded in the process where the code runs. Fits done by worker processes
+    return their timing with the result, so they are recorded by the main process; parsing of
+    files in worker processes (DataLoader.load_many) is not recorded.
+    """
+
+    def __init__(self, enabled=False, max_events=1000):
+        self.enabled = enabled
+        self.timers = {}  # Name: {"count", "total", "max", "last"} in seconds
+        self.counters = {}
+        self.events = deque(maxlen=max_events)
+        self.latest = None  # (name, seconds) of the latest recorded time, e.g. for the status bar
+        self.profiler = None
+        self._lock = threading.Lock()  # Files are parsed also in threads
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def timer(self, name, **details):
+        """
+        Measures the wall time of the block under the name. With details, also logs it as an event.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **details)
+
+    def wrap(self, name, func):
+        """
+        Returns func measured by the timer of the name, e.g. for canvas.draw.
+        """
+        @wraps(func)
+        def timed(*args, **kwargs):
+            with self.timer(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def record(self, name, seconds, **details):
+        """
+        Adds a measured time to the timer of the name. With details, also logs it as an event.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            timer = self.timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+            timer["last"] = seconds
+            self.latest = (name, seconds)
+            if details:
+                self.events.append({"name": name, "at": time.perf_counter() - self._start,
+                                    "time": seconds, **details})
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+            self.events.clear()
+            self.latest = None
+            self._start = time.perf_counter()
+
+    def summary(self):
+        """
+        Returns rows (name, count, total, mean, max, last) of the timers, times in seconds,
+        the largest total first.
+        """
+        with self._lock:
+            rows = [(name, timer["count"], timer["total"], timer["total"] / timer["count"], timer["max"],
+                     timer["last"]) for name, timer in self.timers.items() if timer["count"]]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def to_dict(self):
+        with self._lock:
+            return {"timers": {name: dict(timer) for name, timer in self.timers.items()},
+                    "counters": dict(self.counters), "events": list(self.events)}
+
+    def save_json(self, filepath):
+        with open(filepath, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+
+    def start_profile(self):
+        """
+        Starts (or continues) recording a cProfile profile of the calling thread.
+        """
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_profile(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def save_profile(self, filepath):
+        """
+        Dumps the recorded profile (pstats format). Returns False if nothing has been recorded.
+        """
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+        self.profiler.dump_stats(filepath)
+        return True
+
+
+# Shared by the modules of the application, enabled from the Diagnostics window
+instruments = Instruments()
@@ -0,0 +1,131 @@
+# knees.py
+
+import numpy as np
+
+
+def hysteresis_states(values, low, high):
+    """
+    Two-level state of the signal: 1 above high, 0 below low, in between (and NaN)
+    the previous state is kept, so noise around a single threshold does not toggle the state.
+    Values before the first defined state take that state. Vectorized, O(n).
+    """
+    state = np.full(len(values), -1, dtype=np.int8)
+    state[values >= high] = 1
+    state[values <= low] = 0
+    defined = np.flatnonzero(state >= 0)
+    if len(defined) == 0:
+        return np.zeros(len(values), dtype=np.int8)
+    # Index of the last defined state at each position
+    last = np.where(state >= 0, np.arange(len(values)), 0)
+    np.maximum.accumulate(last, out=last)
+    last[:defined[0]] = defined[0]
+    return state[last]
+
+
+def merge_close(indices, min_samples, scores=None):
+    """
+    Groups sorted indices closer than min_samples to each other and returns one index per group,
+    the first one, or the one with the highest score if scores are given.
+    """
+    if len(indices) == 0:
+        return indices
+    group = np.concatenate(([0], np.cumsum(np.diff(indices) >= min_samples)))
+    if scores is None:
+        first = np.concatenate(([True], group[1:] != group[:-1]))
+        return indices[first]
+    # Highest score within each group: sort by group, then by score
+    order = np.lexsort((-scores, group))
+    first = np.concatenate(([True], group[order][1:] != group[order][:-1]))
+    return indices[order[first]]
+
+
+class KneeFinder:
+    """
+    Automatic detection of knees (change points) where sections for fitting start and end.
+
+    Primarily the edges of gas pulses are found in the concentration 'c': its low and high
+    levels are estimated from percentiles and the signal is switched between them with
+    hysteresis at 25 % and 75 % of the step. If 'c' has no pulses (the step is not clearly
+    above its noise), abrupt changes of the slope of the response 'y' are used instead:
+    the smoothed derivative is compared with its robust (MAD) scale.
+
+    Both detectors are vectorized and run in O(n). Knees closer than min_samples data points
+    are merged. The first and the last x are always included, so the knees feed
+    "Create Sections" directly.
+    """
+
+    def __init__(self, min_samples=5, step_to_noise=4.0, window=5, threshold=8.0):
+        self.min_samples = min_samples  # Minimal distance of knees in data points
+        self.step_to_noise = step_to_noise  # Minimal ratio of the pulse height to the noise of 'c'
+        self.window = window  # Moving average of 'y' before differentiation, in data points
+        self.threshold = threshold  # Minimal robust z-score of the derivative of 'y'
+
+    def find(self, data, source="auto"):
+        """
+        Finds knees in the loaded data.
+
+        Parameters:
+            data (dict): Loaded data with 'x', 'y' and 'c'.
+            source (str): "c" (concentration edges), "y" (response slope changes),
+                          or "auto" ('c' if it contains pulses, otherwise 'y').
+
+        Returns:
+            list: Sorted x-coordinates of the knees, including the first and the last x.
+        """
+        x = data['x']
+        indices = None
+        if source in ("auto", "c") and 'c' in data:
+            indices = self.concentration_edges(data['c'])
+        if indices is None and source in ("auto", "y"):
+            indices = self.response_changes(data['y'])
+        if indices is None:
+            indices = np.array([], dtype=int)
+        knees = np.concatenate(([x[0]], x[indices], [x[-1]]))
+        return sorted(set(float(knee) for knee in knees))
+
+    def concentration_edges(self, c):
+        """
+        Returns indices of the first data points after the edges of pulses in c,
+        or None if c has no pulses.
+        """
+        c = np.asarray(c, dtype=float)
+        if len(c) < 2 or np.isnan(c).all():
+            return None
+        low_level, high_level = np.nanpercentile(c, [5, 95])
+        step = high_level - low_level
+        diff = np.diff(c)
+        diff = diff[~np.isnan(diff)]
+        # Noise of a sample estimated from the differences of neighbours
+        noise = 1.4826 * np.median(np.abs(diff - np.median(diff))) / np.sqrt(2) if len(diff) else 0.0
+        if step <= 0 or step <= self.step_to_noise * noise:
+            return None
+        states = hysteresis_states(c, low_level + 0.25 * step, low_level + 0.75 * step)
+        edges = np.flatnonzero(np.diff(states)) + 1
+        if len(edges) == 0:
+            return None
+        return merge_close(edges, self.min_samples)
+
+    def response_changes(self, y):
+        """
+        Returns indices where the smoothed derivative of y jumps out of its usual range,
+        the strongest point of every group of neighbouring outliers.
+        """
+        y = np.asarray(y, dtype=float)
+        if len(y) < self.window + 2:
+            return np.array([], dtype=int)
+        valid = ~np.isnan(y)
+        if not valid.all():
+            y = np.interp(np.arange(len(y)), np.flatnonzero(valid), y[valid])
+        # Moving average by cumulative sums
+        cumsum = np.concatenate(([0.0], np.cumsum(y)))
+        smooth = (cumsum[self.window:] - cumsum[:-self.window]) / self.window
+        derivative = np.diff(smooth)
+        center = np.median(derivative)
+        scale = 1.4826 * np.median(np.abs(derivative - center))
+        if scale == 0:
+            return np.array([], dtype=int)
+        z = np.abs(derivative - center) / scale
+        candidates = np.flatnonzero(z > self.threshold)
+        # Shift to the data point where the change starts within the averaging window
+        knees = merge_close(candidates, self.min_samples, z[candidates]) + self.window // 2
+        return np.clip(knees, 1, len(y) - 1)
@@ -0,0 +1,144 @@
+# response_times.py
+
+import math
+
+import numpy as np
+from scipy.optimize import brentq
+
+# Fractions of the total change reached at the response times
+RESPONSE_LEVELS = {"t10": 0.1, "t50": 0.5, "t63": 1 - np.exp(-1), "t90": 0.9}
+
+
+def extremum_time(A1, tau1, A2, tau2):
+    """
+    Time of the extremum of A1*exp(-t/tau1) + A2*exp(-t/tau2) for t >= 0, 0 if there is none.
+    A sum of two exponentials has at most one extremum (only if the amplitudes have opposite signs),
+    so the curve is monotone before and after it.
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        t = np.log(-(A1 * tau2) / (A2 * tau1)) / (1 / tau1 - 1 / tau2)
+    return np.where(np.isfinite(t) & (t > 0), t, 0.0)
+
+
+def crossing_times(A1, tau1, A2, tau2, target, max_iter=100, rtol=1e-12):
+    """
+    Last time at which u(t) = A1*exp(-t/tau1) + A2*exp(-t/tau2) crosses the target
+    (0 < target), i.e. from which on u stays below it. Arrays are solved together.
+
+    The last crossing lies on a branch where u is monotone decreasing: after the extremum
+    if u is above the target there, otherwise before it. Within the branch the root is bracketed
+    and found by Newton steps, falling back to bisection when a step leaves the bracket.
+
+    Returns:
+        ndarray: Crossing times, 0 where u starts between 0 and the target and never exceeds it,
+                 NaN where u starts below 0 and never exceeds it, or for invalid parameters.
+    """
+    A1, tau1, A2, tau2, target = np.broadcast_arrays(*(np.asarray(a, dtype=float)
+                                                       for a in (A1, tau1, A2, tau2, target)))
+
+    def u(t):
+        return A1 * np.exp(-t / tau1) + A2 * np.exp(-t / tau2)
+
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+        valid = (tau1 > 0) & (tau2 > 0) & np.isfinite(A1) & np.isfinite(A2) & (target > 0)
+        t_ext = extremum_time(A1, tau1, A2, tau2)
+        u_ext = u(t_ext)
+        u_start = u(0.0)
+        after = u_ext > target  # Root after the extremum
+        before = ~after & (u_start > target)  # Root before it (the curve rises back, but stays below)
+        # |u(t)| <= (|A1| + |A2|) * exp(-t / max(tau)), which is below the target after t_bound
+        t_bound = np.maximum(tau1, tau2) * np.log((np.abs(A1) + np.abs(A2)) / target)
+        solve = valid & (after | before)
+        lo = np.where(solve & after, t_ext, 0.0)
+        hi = np.where(solve, np.where(after, np.maximum(t_ext, t_bound), t_ext), 0.0)
+
+        # Newton from the left end, where u is above the target, approaches the root from one side
+        # while u is convex; a step leaving the bracket is replaced by bisection
+        t = lo
+        for _ in range(max_iter):
+            e1, e2 = np.exp(-t / tau1), np.exp(-t / tau2)
+            residual = A1 * e1 + A2 * e2 - target
+            slope = -A1 / tau1 * e1 - A2 / tau2 * e2
+            # u decreases within the bracket: above the target the root is to the right
+            above = residual > 0
+            lo = np.where(above, t, lo)
+            hi = np.where(above, hi, t)
+            t_next = t - residual / slope
+            outside = ~((t_next >= lo) & (t_next <= hi))  # Also NaN
+            if outside.any():
+                t_next = np.where(outside, 0.5 * (lo + hi), t_next)
+            t_next = np.where(solve, t_next, 0.0)  # Also for 0-d (scalar) inputs
+            converged = (np.abs(t_next - t) <= rtol * np.maximum(np.abs(t_next), 1.0)).all()
+            t = t_next
+            if converged:
+                break
+
+    return np.where(valid & (solve | (u_start >= 0)), t, np.nan)
+
+
+def crossing_time(A1, tau1, A2, tau2, target):
+    """
+    crossing_times for a single curve. The same branch of u is bracketed and the root found
+    by brentq on Python floats, which is much faster than the vectorized loop for one value.
+    """
+    A1, tau1, A2, tau2, target = float(A1), float(tau1), float(A2), float(tau2), float(target)
+    if not (tau1 > 0 and tau2 > 0 and math.isfinite(A1) and math.isfinite(A2) and target > 0):
+        return math.nan
+
+    def residual(t):
+        return A1 * math.exp(-t / tau1) + A2 * math.exp(-t / tau2) - target
+
+    try:
+        t_ext = math.log(-(A1 * tau2) / (A2 * tau1)) / (1 / tau1 - 1 / tau2)
+    except (ValueError, ZeroDivisionError):
+        t_ext = 0.0  # No extremum
+    if not (math.isfinite(t_ext) and t_ext > 0):
+        t_ext = 0.0
+    u_start = A1 + A2
+    if residual(t_ext) > 0:
+        # Root after the extremum, below the target from t_bound on (see crossing_times)
+        t_bound = max(tau1, tau2) * math.log((abs(A1) + abs(A2)) / target)
+        return brentq(residual, t_ext, max(t_ext, t_bound), xtol=1e-12)
+    if u_start > target:
+        return brentq(residual, 0.0, t_ext, xtol=1e-12)
+    return 0.0 if u_start >= 0 else math.nan
+
+
+def solve_response_times(codes, params, prev_y0, levels=RESPONSE_LEVELS):
+    """
+    Response (or recovery) times of fitted sections, solved for all sections in one vectorized pass.
+
+    The time t_p of a section is measured from its start, when the fitted curve has gone through
+    the fraction p of the total change from prev_y0 (the level before the section) to its y0.
+    Single exponentials have the closed form -tau1*ln(1 - p), as their amplitude is the whole change.
+
+    Parameters:
+        codes (ndarray): Fit type codes (Fitter.FIT_CODES) of shape (S,).
+        params (ndarray): Parameters of shape (S, 5) in Fitter.PARAM_NAMES order.
+        prev_y0 (ndarray): Levels before the sections, shape (S,).
+        levels (dict): Names of the times and their fractions of the change.
+
+    Returns:
+        dict: Array of shape (S,) for every level name, NaN where the time cannot be calculated
+              (no change, unfitted or unsupported fit type).
+    """
+    codes = np.asarray(codes)
+    params = np.asarray(params, dtype=float).reshape(-1, 5)
+    y0, A1, tau1, A2, tau2 = params.T
+    total_change = np.asarray(prev_y0, dtype=float) - y0
+    single = codes == 1
+    double = (codes == 2) & (total_change != 0) & np.isfinite(total_change)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Normalized so that the curve decays towards 0 from the side of prev_y0
+        A1_norm, A2_norm = A1 / total_change, A2 / total_change
+
+    times = {}
+    for name, fraction in levels.items():
+        values = np.full(len(codes), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[single] = -tau1[single] * np.log(1 - fraction)
+        if double.any():
+            values[double] = crossing_times(A1_norm[double], tau1[double], A2_norm[double], tau2[double],
+                                            1 - fraction)
+        times[name] = values
+    return times
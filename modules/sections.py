@@ -0,0 +1,154 @@
+# sections.py
+
+import numpy as np
+import pandas as pd
+
+# Columns shown in the section table and exported, prev_y0 is kept only for the t90 calculation
+COLUMNS = ("#", "From", "To", "Type", "y0", "A1", "tau1", "A2", "tau2", "tau90", "Comment")
+
+SECTION_DTYPE = np.dtype([
+    ("#", "i8"),
+    ("From", "f8"),
+    ("To", "f8"),
+    ("Type", "U20"),
+    ("y0", "f8"),
+    ("A1", "f8"),
+    ("tau1", "f8"),
+    ("A2", "f8"),
+    ("tau2", "f8"),
+    ("tau90", "f8"),
+    ("Comment", "U256"),
+    ("prev_y0", "f8"),
+])
+
+FIT_COLUMNS = ("Type", "y0", "A1", "tau1", "A2", "tau2", "tau90", "prev_y0")
+
+
+def section_slice(x, from_x, to_x):
+    """
+    Returns the slice of sorted x within [from_x, to_x], the same data as the mask
+    (x >= from_x) & (x <= to_x) but found by binary search in O(log n) and giving views.
+    """
+    start = np.searchsorted(x, from_x, side='left')
+    stop = np.searchsorted(x, to_x, side='right')
+    return slice(int(start), int(max(stop, start)))
+
+
+def empty_sections(n):
+    """
+    Returns a structured array of n blank sections (NaN parameters, empty Type and Comment).
+    """
+    data = np.zeros(n, dtype=SECTION_DTYPE)
+    for name in ("y0", "A1", "tau1", "A2", "tau2", "tau90", "prev_y0"):
+        data[name] = np.nan
+    return data
+
+
+class SectionTable:
+    """
+    Sections for fitting stored in one structured NumPy array with native floats,
+    values not fitted (or not used by the fit type) are NaN.
+
+    Indexing returns a record (numpy.void) which is a view into the table, so
+    `table[i]["y0"] = value` updates the table. Records are invalidated when the table
+    grows beyond its capacity, so they should not be kept across append().
+    The array grows by doubling, `data` is the view of the used part.
+
+    Start/stop indices of sections within the data are cached by slices(x) and recalculated
+    only when x or any section range changes.
+    """
+
+    __slots__ = ("_buffer", "_size", "_indexed_x", "_indexed_ranges", "_starts", "_stops")
+
+    def __init__(self, capacity=16):
+        self._buffer = empty_sections(capacity)
+        self._size = 0
+        self._indexed_x = None
+        self._indexed_ranges = None
+        self._starts = None
+        self._stops = None
+
+    @property
+    def data(self):
+        return self._buffer[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, idx):
+        return self.data[idx]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def append(self, from_x, to_x):
+        """
+        Adds a blank section between from_x and to_x and returns its record.
+        """
+        if self._size == len(self._buffer):
+            grown = empty_sections(max(2 * len(self._buffer), 16))
+            grown[:self._size] = self._buffer
+            self._buffer = grown
+        section = self._buffer[self._size]
+        self._size += 1
+        section["#"] = self._size
+        section["From"] = from_x
+        section["To"] = to_x
+        return section
+
+    def remove(self, idx):
+        """
+        Removes the section at index idx and renumbers the following ones.
+        """
+        self._buffer[idx:self._size - 1] = self._buffer[idx + 1:self._size]
+        self._buffer[self._size - 1] = empty_sections(1)[0]
+        self._size -= 1
+        self.data["#"] = np.arange(1, self._size + 1)
+
+    def clear(self):
+        self._buffer[:self._size] = empty_sections(self._size)
+        self._size = 0
+
+    def clear_fits(self):
+        """
+        Resets fit results of all sections, keeping their ranges and comments.
+        """
+        blank = empty_sections(self._size)
+        for name in FIT_COLUMNS:
+            self.data[name] = blank[name]
+
+    def slices(self, x):
+        """
+        Returns (starts, stops) index arrays of all sections within sorted x,
+        so x[starts[i]:stops[i]] is the data of section i.
+        """
+        ranges = np.column_stack((self.data["From"], self.data["To"]))
+        if self._indexed_x is not x or not np.array_equal(ranges, self._indexed_ranges):
+            self._starts = np.searchsorted(x, ranges[:, 0], side='left')
+            self._stops = np.maximum(np.searchsorted(x, ranges[:, 1], side='right'), self._starts)
+            self._indexed_x = x
+            self._indexed_ranges = ranges
+        return self._starts, self._stops
+
+    def section_slice(self, idx, x):
+        """
+        Returns the slice of sorted x (and of y, c) belonging to the section at index idx.
+        """
+        starts, stops = self.slices(x)
+        return slice(int(starts[idx]), int(stops[idx]))
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """
+        Creates the table from a sequence of (From, To) pairs.
+        """
+        table = cls(max(len(ranges), 16))
+        for from_x, to_x in ranges:
+            table.append(from_x, to_x)
+        return table
+
+    def to_frame(self):
+        """
+        Returns the sections as a DataFrame with the table COLUMNS, NaN for empty values.
+        """
+        return pd.DataFrame({name: self.data[name] for name in COLUMNS})
@@ -0,0 +1,170 @@
+# synthetic.py
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from modules.fitter import Fitter
+from modules.response_times import solve_response_times
+
+HEADER = ("Time  [s]", "R [Ohm]", "Concentration [ppm]")  # Same as the gas rig export in test_data
+
+
+class SyntheticGenerator:
+    """
+    Synthetic Time/R/Concentration traces with known parameters, for testing at scale.
+
+    The time is split into 2 * n_pulses sections of the same length, gas on and gas off in turns,
+    starting with gas on. In every section R goes from the level reached at the end of the preceding
+    section towards its own level y0, with a single or double exponential response:
+
+        R = y0 + A1 * exp(-(t - From) / tau1) + A2 * exp(-(t - From) / tau2) + drift * t + noise
+
+    The gas on level is baseline * (1 - response), gas off goes back to the baseline. Rows are
+    produced in chunks, so traces of 10^8 points are written without holding them in memory;
+    the same seed gives the same trace regardless of the chunk size.
+    """
+
+    def __init__(self, n_points=10000, n_pulses=5, dt=2.5, model="double", baseline=3.88e8, response=0.3,
+                 concentration=100.0, response_taus=(20.0, 150.0), recovery_taus=(40.0, 300.0),
+                 fast_fraction=0.6, noise=1e-3, drift=0.0, jitter=0.1, seed=0):
+        """
+        Parameters:
+            n_points (int): Number of rows.
+            n_pulses (int): Number of gas pulses (each gives a gas on and a gas off section).
+            dt (float): Mean sampling interval [s].
+            model (str): "single" or "double" exponential responses.
+            baseline (float): R without gas.
+            response (float): Relative change of R with gas (positive = R drops).
+            concentration (float): Concentration during gas pulses.
+            response_taus (tuple): (tau1, tau2) of gas on sections, only tau1 is used by the single model.
+            recovery_taus (tuple): (tau1, tau2) of gas off sections.
+            fast_fraction (float): Part of the change made by the tau1 component of the double model.
+            noise (float): Standard deviation of the Gaussian noise relative to the baseline.
+            drift (float): Linear drift of R per second.
+            jitter (float): Uniform jitter of sampling times relative to dt (below 0.5 keeps them sorted).
+            seed (int): Seed of the noise and jitter.
+        """
+        if model not in ("single", "double"):
+            raise ValueError(f"Unknown model '{model}', use 'single' or 'double'.")
+        self.n_points = int(n_points)
+        self.n_pulses = max(int(n_pulses), 1)
+        self.dt = dt
+        self.model = model
+        self.baseline = baseline
+        self.concentration = concentration
+        self.noise = noise * baseline
+        self.drift = drift
+        self.jitter = jitter * dt
+        self.seed = seed
+
+        # Sections and their parameters, the start of a section continues the preceding one
+        n_sections = 2 * self.n_pulses
+        self.section_length = self.n_points * dt / n_sections
+        self.edges = np.arange(n_sections + 1) * self.section_length
+        gas_on = np.arange(n_sections) % 2 == 0
+        self.levels = np.where(gas_on, baseline * (1 - response), baseline)
+        taus = np.where(gas_on[:, None], np.asarray(response_taus, dtype=float),
+                        np.asarray(recovery_taus, dtype=float))
+        self.tau1 = taus[:, 0]
+        self.tau2 = taus[:, 1] if model == "double" else np.full(n_sections, np.nan)
+        fraction = fast_fraction if model == "double" else 1.0
+        self.A1 = np.empty(n_sections)
+        self.A2 = np.empty(n_sections) if model == "double" else np.full(n_sections, np.nan)
+        start = baseline
+        for idx in range(n_sections):
+            change = start - self.levels[idx]
+            self.A1[idx] = fraction * change
+            decay = np.exp(-self.section_length / self.tau1[idx])
+            end = self.levels[idx] + self.A1[idx] * decay
+            if model == "double":
+                self.A2[idx] = (1 - fraction) * change
+                end += self.A2[idx] * np.exp(-self.section_length / self.tau2[idx])
+            start = end
+        self.gas_on = gas_on
+
+    def ground_truth(self):
+        """
+        Returns the parameters of the sections as a DataFrame with the columns of the section table
+        (From, To, Type, y0, A1, tau1, A2, tau2 and tau90). The amplitudes are at From, the first
+        data point of a section is slightly later, which scales them by exp(-(x0 - From) / tau).
+        """
+        fit_type = "Double Exp. Decay" if self.model == "double" else "Single Exp. Decay"
+        params = np.column_stack([self.levels, self.A1, self.tau1, self.A2, self.tau2])
+        codes = np.full(len(self.levels), Fitter.FIT_CODES[fit_type])
+        # t90 counts from the level of the preceding section, as in the application
+        prev_y0 = np.concatenate(([self.baseline], self.levels[:-1]))
+        tau90 = solve_response_times(codes, params, prev_y0, {"t90": 0.9})["t90"]
+        return pd.DataFrame({
+            "#": np.arange(1, len(self.levels) + 1), "From": self.edges[:-1], "To": self.edges[1:],
+            "Type": fit_type, "y0": self.levels, "A1": self.A1, "tau1": self.tau1,
+            "A2": self.A2, "tau2": self.tau2, "tau90": tau90,
+        })
+
+    def values(self, x):
+        """
+        Returns noiseless R and the concentration at times x.
+        """
+        idx = np.clip(np.searchsorted(self.edges, x, side='right') - 1, 0, len(self.levels) - 1)
+        t = x - self.edges[idx]
+        y = self.levels[idx] + self.A1[idx] * np.exp(-t / self.tau1[idx])
+        if self.model == "double":
+            y += self.A2[idx] * np.exp(-t / self.tau2[idx])
+        c = np.where(self.gas_on[idx], self.concentration, 0.0)
+        return y + self.drift * x, c
+
+    def chunks(self, chunk_size=1000000):
+        """
+        Yields (x, y, c) arrays of consecutive rows, at most chunk_size rows each.
+        """
+        jitter_rng, noise_rng = (np.random.default_rng(seed)
+                                 for seed in np.random.SeedSequence(self.seed).spawn(2))
+        for start in range(0, self.n_points, chunk_size):
+            stop = min(start + chunk_size, self.n_points)
+            x = (np.arange(start, stop) + 0.5) * self.dt
+            if self.jitter:
+                x += jitter_rng.uniform(-self.jitter, self.jitter, stop - start)
+            y, c = self.values(x)
+            if self.noise:
+                y += noise_rng.normal(scale=self.noise, size=stop - start)
+            yield x, y, c
+
+    def generate(self):
+        """
+        Returns the whole trace as a dict of 'x', 'y', 'c' and labels, like DataLoader.load_xyc.
+        """
+        x, y, c = (np.concatenate(columns) for columns in zip(*self.chunks()))
+        return {'x': x, 'y': y, 'c': c, 'xlabel': HEADER[0], 'ylabel': HEADER[1], 'zlabel': HEADER[2]}
+
+    def write(self, filepath, chunk_size=1000000):
+        """
+        Writes the trace as a tab separated file readable by DataLoader, chunk by chunk.
+        """
+        with open(filepath, 'w', encoding='utf-8', newline='\n') as file:
+            file.write("\t".join(HEADER) + "\n")
+            for x, y, c in self.chunks(chunk_size):
+                np.savetxt(file, np.column_stack((x, y, c)), fmt=("%.2f", "%.6E", "%g"), delimiter="\t")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Writes a synthetic Time/R/Concentration trace and its ground truth")
+    parser.add_argument("output", help="data file to write (tab separated)")
+    parser.add_argument("--points", type=float, default=1e5, help="number of rows, e.g. 1e7 (default: 1e5)")
+    parser.add_argument("--pulses", type=int, default=5, help="number of gas pulses (default: 5)")
+    parser.add_argument("--model", default="double", choices=["single", "double"], help="response model")
+    parser.add_argument("--noise", type=float, default=1e-3, help="noise relative to the baseline (default: 1e-3)")
+    parser.add_argument("--drift", type=float, default=0.0, help="drift of R per second (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the noise (default: 0)")
+    parser.add_argument("--truth", help="CSV with the ground truth (default: output with .truth.csv)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    generator = SyntheticGenerator(n_points=int(args.points), n_pulses=args.pulses, model=args.model,
+                                   noise=args.noise, drift=args.drift, seed=args.seed)
+    generator.write(args.output)
+    truth = args.truth or args.output.rsplit(".", 1)[0] + ".truth.csv"
+    generator.ground_truth().to_csv(truth, index=False, sep=';')
+    print(f"{generator.n_points} rows written to {args.output}, ground truth to {truth}")
@@ -0,0 +1,33 @@
+# test_data_loader.py
+
+import numpy as np
+
+from modules.data_loader import DataLoader
+
+
+def test_iter_blocks_text_fallback_after_blank_lines():
+    # Blank lines in the first block, a non-numeric cell in the third one
+    content = (
+        "Time [s]\tR [Ohm]\tConcentration [ppm]\n"
+        "0\t10\t0\n"
+        "\n"
+        "1\t11\t0\n"
+        "\n"
+        "2\t12\t0\n"
+        "3\t13\t0\n"
+        "4\t14\t1\n"
+        "5\t15\t1\n"
+        "6\t16\t1\n"
+        "7\t17\t1\n"
+        "8\t#NAME?\t1\n"
+        "9\t19\t1\n"
+    ).encode('utf-8')
+    loader = DataLoader(use_cache=False)
+    column_mapping = {'time': "Time [s]", 'r': "R [Ohm]", 'concentration': "Concentration [ppm]"}
+
+    blocks = list(loader.iter_blocks(content, 'utf-8', '\t', column_mapping, chunksize=4))
+
+    x = np.concatenate([block['x'] for block in blocks])
+    y = np.concatenate([block['y'] for block in blocks])
+    np.testing.assert_array_equal(x, [0, 1, 2, 3, 4, 5, 6, 7, 9])
+    np.testing.assert_array_equal(y, [10, 11, 12, 13, 14, 15, 16, 17, 19])
@@ -0,0 +1,28 @@
+# test_response_times.py
+
+import numpy as np
+import pytest
+
+from modules.response_times import crossing_time, crossing_times
+
+
+@pytest.mark.parametrize("A1, tau1, A2, tau2, target", [
+    (0.6, 10.0, 0.4, 100.0, 0.1),  # Monotone decay
+    (1.5, 10.0, -0.5, 50.0, 0.1),  # Overshoot below the target, root before the extremum
+    (-0.5, 10.0, 1.5, 50.0, 0.1),  # Rises first, root after the extremum
+    (0.05, 10.0, 0.0, 10.0, 0.1),  # Starts below the target
+])
+def test_crossing_times_scalar_matches_crossing_time(A1, tau1, A2, tau2, target):
+    t = crossing_times(A1, tau1, A2, tau2, target)
+    assert np.ndim(t) == 0
+    assert float(t) == pytest.approx(crossing_time(A1, tau1, A2, tau2, target), rel=1e-9, abs=1e-12)
+
+
+def test_crossing_times_array():
+    A1 = np.array([0.6, 1.5, -0.5, 0.05, np.nan])
+    tau1 = np.array([10.0, 10.0, 10.0, 10.0, 10.0])
+    A2 = np.array([0.4, -0.5, 1.5, 0.0, 0.0])
+    tau2 = np.array([100.0, 50.0, 50.0, 10.0, 10.0])
+    t = crossing_times(A1, tau1, A2, tau2, 0.1)
+    expected = [crossing_time(*args, 0.1) for args in zip(A1, tau1, A2, tau2)]
+    np.testing.assert_allclose(t, expected, rtol=1e-9, atol=1e-12)